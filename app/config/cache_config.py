@@ -29,4 +29,16 @@ CACHE_LOG_PATH = CACHE_DIR / "cache_stats.log"
 
 # Query hashing settings
 CONSIDER_SESSION_IN_HASH = False  # Whether to include session ID in query hash
-MAX_HISTORY_FOR_HASH = 3  # How many previous exchanges to consider for context
\ No newline at end of file
+MAX_HISTORY_FOR_HASH = 3  # How many previous exchanges to consider for context
+
+# Shopify API response cache settings
+SHOPIFY_CACHE_ENABLED = True  # Cache Shopify admin API responses between indexing runs
+SHOPIFY_CACHE_DB_PATH = CACHE_DIR / "shopify_cache.db"
+SHOPIFY_CACHE_TTL_NORMAL = 60  # Seconds - blogs and products change slowly
+SHOPIFY_CACHE_TTL_SHORT = 10  # Seconds - articles change more often
+SHOPIFY_CACHE_SIZE_LIMIT = 1000  # Least frequently used entries are evicted beyond this
+
+# Embedding cache settings
+EMBEDDING_CACHE_ENABLED = True  # Reuse embeddings of unchanged chunks across indexing runs
+EMBEDDING_CACHE_DB_PATH = CACHE_DIR / "embedding_cache.db"
+EMBEDDING_CACHE_TTL = 30 * 86400  # Time to live for cached embeddings in seconds (default: 30 days)
@@ -47,6 +47,8 @@ class ChatConfig:
         self.PINECONE_DIMENSION = 1536  # Changed from 512 to 1536 to match existing index
         self.PINECONE_CLOUD = os.getenv("PINECONE_CLOUD")
         self.PINECONE_REGION = os.getenv("PINECONE_REGION")
+        self.PINECONE_READY_TIMEOUT = 30         # Seconds to wait for a new index to become ready
+        self.PINECONE_READY_POLL_INTERVAL = 0.5  # Seconds between index readiness checks
 
         # OpenAI Settings
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -59,8 +61,16 @@ class ChatConfig:
         self.SUMMARIZE_CONTENT = False  # Set to True if you want to summarize content
         self.SUMMARIZE_THRESHOLD = 8192  # Set to True if you want to summarize content
         self.SAVE_INTERMEDIATE_FILES = True  # Save JSON files during processing
+        self.INCREMENTAL_INDEXING = True  # Only re-index Shopify content whose updated_at changed
         self.CHUNK_SIZE = 800          # Reduced from 1024 for more granular retrieval
         self.CHUNK_OVERLAP = 200       # Increased from 128 for better context continuity
+        self.PINECONE_UPSERT_BATCH_SIZE = 100  # Vectors per Pinecone upsert request
+        self.EMBEDDING_MAX_CONCURRENCY = 4     # Batches in flight at once, bounded for OpenAI rate limits
+        self.EMBEDDING_BATCH_MAX_TOKENS = 20000  # Tokens per embedding request, chunks are packed up to this
+        self.PINECONE_DELETE_BATCH_SIZE = 1000  # Vector ids per Pinecone delete request, the API maximum
+        self.PINECONE_LIST_CONCURRENCY = 8      # Stale records whose vector ids are listed at once
+        self.PARALLEL_CONVERSION_MIN_RECORDS = 32  # Convert HTML in worker processes from this many records
+        self.CONVERSION_MAX_WORKERS = None     # Worker processes for HTML conversion, None uses every core
         self.QA_SOURCE_FILE = "app/services/qagold.txt"
         self.QA_SOURCE_FILE_JSON = "app/services/qagold.json"
 
@@ -71,6 +81,8 @@ class ChatConfig:
         self.PRODUCTS_FILE = os.path.join(self.OUTPUT_DIR, "products.json")
         self.PRODUCTS_PROCESSED_FILE = os.path.join(self.OUTPUT_DIR, "products_processed.json")
         self.COMBINED_FILE = os.path.join(self.OUTPUT_DIR, "msquare_combined.json")
+        self.INDEX_MANIFEST_FILE = os.path.join(self.OUTPUT_DIR, "manifest.json")  # Indexed record id -> updated_at
+        self.SHOPIFY_CONTENT_FILE = os.path.join(self.OUTPUT_DIR, "content.json.zst")  # Fetched blogs, articles and products
 
         # API Settings
         self.API_HOST = "0.0.0.0"
@@ -0,0 +1,19 @@
+"""
+Data models for content indexing.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass(slots=True)
+class Record:
+    """Content record prepared for indexing to Pinecone."""
+    title: str
+    url: str
+    markdown: Optional[str]
+    type: str = 'content'
+    id: Optional[str] = None  # Stable id in the form {type}:{source_id}, used for vector ids
+    chunks: Optional[List[str]] = None  # Pre-split markdown, if chunked during conversion
+    updated_at: Optional[str] = None
+    keywords: Optional[List[str]] = None
+    special_type: Optional[str] = None
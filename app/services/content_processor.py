@@ -1,21 +1,46 @@
 """
 Content processor service for document processing and Pinecone indexing.
 """
+import asyncio
+import logging
 import time
 import os
-from typing import List, Dict, Any, Optional
+import uuid
+from typing import Callable, List, Dict, Optional
 
+import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 from langchain_openai import OpenAIEmbeddings
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
 
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
+from app.services.embedding_cache_service import embedding_cache
 from app.services.enhancement_service import enhancement_service
 from app.utils.logging_utils import get_logger
 
 
+def wait_for_index_ready(pc, config: ChatConfig) -> None:
+    """
+    Wait until a newly created Pinecone index is ready to accept upserts.
+
+    Args:
+        pc: Pinecone client
+        config: Configuration with the index name and readiness polling settings
+
+    Raises:
+        TimeoutError: If the index is not ready within PINECONE_READY_TIMEOUT seconds
+    """
+    deadline = time.monotonic() + config.PINECONE_READY_TIMEOUT
+    while not pc.describe_index(config.PINECONE_INDEX_NAME).status['ready']:
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Pinecone index '{config.PINECONE_INDEX_NAME}' not ready after "
+                               f"{config.PINECONE_READY_TIMEOUT} seconds")
+        time.sleep(config.PINECONE_READY_POLL_INTERVAL)
+
+
 class ContentProcessor:
     """
     Base class for processing and indexing document content to Pinecone.
@@ -37,7 +62,7 @@ class ContentProcessor:
         # Create output directory if needed
         os.makedirs(self.config.OUTPUT_DIR, exist_ok=True)
 
-    def process_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def process_records(self, records: List[Record]) -> List[Record]:
         """
         Process and enhance records before indexing.
         
@@ -55,116 +80,92 @@ class ContentProcessor:
         
         return enhanced_records
 
-    def index_to_pinecone(self, records: List[Dict[str, Any]]) -> bool:
+    def ensure_index(self, pc: Optional[Pinecone] = None) -> bool:
+        """
+        Create the Pinecone index if it doesn't exist yet.
+
+        Args:
+            pc: Pinecone client, created from the configuration if not given
+
+        Returns:
+            True if the index was just created and holds no vectors yet
+        """
+        pc = pc or Pinecone(api_key=self.config.PINECONE_API_KEY)
+
+        # Check if index exists
+        existing_indexes = pc.list_indexes().names()
+
+        if self.config.PINECONE_INDEX_NAME in existing_indexes:
+            self.logger.info("Using existing Pinecone index: %s", self.config.PINECONE_INDEX_NAME)
+            return False
+
+        # Create index if it doesn't exist
+        self.logger.info("Creating new Pinecone index: %s", self.config.PINECONE_INDEX_NAME)
+
+        pc.create_index(
+            name=self.config.PINECONE_INDEX_NAME,
+            dimension=self.config.PINECONE_DIMENSION,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud=self.config.PINECONE_CLOUD,
+                region=self.config.PINECONE_REGION
+            )
+        )
+
+        # Wait for index to initialize
+        self.logger.info("Waiting for index to initialize...")
+        wait_for_index_ready(pc, self.config)
+        return True
+
+    def index_to_pinecone(self, records: List[Record],
+                          stale_ids: Optional[List[str]] = None) -> bool:
+        """
+        Index content records to Pinecone vector database from synchronous code.
+        Callers already running in an event loop should await aindex_to_pinecone instead.
+
+        Args:
+            records: List of enhanced content records with title, url, and markdown
+            stale_ids: Ids of previously indexed records whose outdated vectors should be removed
+
+        Returns:
+            True if indexing was successful, False otherwise
+        """
+        return asyncio.run(self.aindex_to_pinecone(records, stale_ids))
+
+    async def aindex_to_pinecone(self, records: List[Record],
+                                 stale_ids: Optional[List[str]] = None) -> bool:
         """
         Index content records to Pinecone vector database.
+
+        Records with an id get deterministic vector ids ({id}#{chunk}), so new versions
+        overwrite old ones in place and stay retrievable throughout the run. Outdated vectors
+        are only deleted once every batch has been upserted. Blocking Pinecone calls and
+        document preparation run in worker threads, so the event loop stays free.
         
         Args:
             records: List of enhanced content records with title, url, and markdown
+            stale_ids: Ids of previously indexed records whose outdated vectors should be removed,
+                i.e. records deleted from the source and earlier versions of the given records
             
         Returns:
             True if indexing was successful, False otherwise
         """
         try:
-            # If no records, return success
-            if not records:
+            stale_ids = stale_ids or []
+
+            # If nothing changed, return success
+            if not records and not stale_ids:
                 self.logger.warning("No records to index")
                 return True
 
-            self.logger.info(f"Indexing {len(records)} records to Pinecone index "
-                             f"'{self.config.PINECONE_INDEX_NAME}'")
+            self.logger.info("Indexing %d records to Pinecone index '%s'",
+                             len(records), self.config.PINECONE_INDEX_NAME)
 
             # Initialize Pinecone
             pc = Pinecone(api_key=self.config.PINECONE_API_KEY)
+            index_created = await asyncio.to_thread(self.ensure_index, pc)
 
-            # Check if index exists
-            existing_indexes = pc.list_indexes().names()
-
-            # Create index if it doesn't exist
-            if self.config.PINECONE_INDEX_NAME not in existing_indexes:
-                self.logger.info(f"Creating new Pinecone index: {self.config.PINECONE_INDEX_NAME}")
-
-                pc.create_index(
-                    name=self.config.PINECONE_INDEX_NAME,
-                    dimension=self.config.PINECONE_DIMENSION,
-                    metric="cosine",
-                    spec=ServerlessSpec(
-                        cloud=self.config.PINECONE_CLOUD,
-                        region=self.config.PINECONE_REGION
-                    )
-                )
-
-                # Wait for index to initialize
-                self.logger.info("Waiting for index to initialize...")
-                time.sleep(10)
-            else:
-                self.logger.info(f"Using existing Pinecone index: {self.config.PINECONE_INDEX_NAME}")
-
-            # Prepare documents
-            docs = []
-            for i, record in enumerate(records):
-                # Check if record has markdown content
-                if 'markdown' not in record:
-                    self.logger.warning(f"Record {i} missing 'markdown' field: {record}")
-                    continue  # Skip records without markdown
-
-                # Split content into chunks
-                if record.get('type') == 'qa_pair':
-                    # For Q&A content, don't split questions from answers
-                    chunks = [record['markdown']]
-                else:
-                    # Define special technical terms to preserve
-                    special_terms = [
-                        "advanced attribution multiplier",
-                        "attribution multiplier",
-                        "marketing mix modeling",
-                        # Add other multi-word technical terms
-                    ]
-
-                    # Create a custom separator pattern that preserves these terms
-                    separators = ["\n\n", "\n", ". ", " ", ""]
-
-                    # For technical content, use smaller chunks with more overlap
-                    if any(term in record['markdown'].lower() for term in special_terms):
-                        text_splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=self.config.CHUNK_SIZE // 2,  # Smaller chunks for technical content
-                            chunk_overlap=self.config.CHUNK_OVERLAP * 2,  # More overlap
-                            separators=separators
-                        )
-                    else:
-                        text_splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=self.config.CHUNK_SIZE,
-                            chunk_overlap=self.config.CHUNK_OVERLAP,
-                            separators=separators
-                        )
-                    chunks = text_splitter.split_text(record['markdown'])
-
-                # Create documents with metadata
-                for j, chunk in enumerate(chunks):
-                    # Get attribution metadata
-                    attribution_metadata = self.enhancement_service.enrich_attribution_metadata(chunk)
-
-                    # Merge with standard metadata
-                    metadata = {
-                        "title": record['title'],
-                        "url": record['url'],
-                        "chunk": j,
-                        "source": f"{record.get('type', 'content')}"
-                    }
-                    metadata.update(attribution_metadata)
-
-                    # Add keywords if available
-                    if 'keywords' in record:
-                        metadata["keywords"] = record['keywords']
-
-                    # Create embedding prompt
-                    optimized_text = self.enhancement_service.create_embedding_prompt(chunk, metadata)
-
-                    doc = Document(
-                        page_content=optimized_text,
-                        metadata=metadata
-                    )
-                    docs.append(doc)
+            docs = await asyncio.to_thread(self.prepare_documents, records)
 
             # Initialize embeddings
             embeddings = OpenAIEmbeddings(
@@ -175,21 +176,291 @@ class ContentProcessor:
             )
 
             # Index documents
-            self.logger.info(f"Indexing {len(docs)} document chunks to Pinecone...")
-
-            # Store in Pinecone
-            vectorstore = PineconeVectorStore.from_documents(
-                docs,
-                index_name=self.config.PINECONE_INDEX_NAME,
-                pinecone_api_key=self.config.PINECONE_API_KEY,
-                embedding=embeddings
-            )
+            self.logger.info("Indexing %d document chunks to Pinecone...", len(docs))
+
+            # Get the Pinecone index
+            index = pc.Index(self.config.PINECONE_INDEX_NAME)
 
-            self.logger.info(
-                f"Successfully indexed {len(docs)} document chunks to "
-                f"Pinecone index '{self.config.PINECONE_INDEX_NAME}'.")
+            # Embed and upsert in pipelined batches
+            failed_batches = await self.aindex_documents(docs, embeddings, index)
+            if failed_batches:
+                # Keep the outdated vectors, the next run retries these records
+                self.logger.error("Failed to index %d batches to Pinecone", failed_batches)
+                return False
+
+            # Drop vectors of removed records, and old chunks of changed records past their
+            # new chunk count, since a record may now split into fewer chunks than before
+            if stale_ids and not index_created:
+                chunk_counts: Dict[str, int] = {}
+                for doc in docs:
+                    if doc.id:
+                        record_id = doc.id.rsplit("#", 1)[0]
+                        chunk_counts[record_id] = chunk_counts.get(record_id, 0) + 1
+                deleted = await self.adelete_stale_vectors(index, stale_ids, chunk_counts)
+                self.logger.info("Removed %d outdated vectors of %d stale records from Pinecone",
+                                 deleted, len(stale_ids))
+
+            self.logger.info("Successfully indexed %d document chunks to Pinecone index '%s'.",
+                             len(docs), self.config.PINECONE_INDEX_NAME)
             return True
 
         except Exception as e:
-            self.logger.error(f"Error indexing to Pinecone: {str(e)}")
-            return False
\ No newline at end of file
+            self.logger.error("Error indexing to Pinecone: %s", e)
+            return False
+
+    def prepare_documents(self, records: List[Record]) -> List[Document]:
+        """
+        Split records into chunk documents with metadata and embedding prompts.
+
+        Args:
+            records: List of enhanced content records with title, url, and markdown
+
+        Returns:
+            Documents to embed, with {id}#{chunk} ids for records that have an id
+        """
+        # Define special technical terms to preserve
+        special_terms = [
+            "advanced attribution multiplier",
+            "attribution multiplier",
+            "marketing mix modeling",
+            # Add other multi-word technical terms
+        ]
+
+        # Create a custom separator pattern that preserves these terms
+        separators = ["\n\n", "\n", ". ", " ", ""]
+
+        # Splitter configuration doesn't vary per record, so build them once
+        technical_text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.config.CHUNK_SIZE // 2,  # Smaller chunks for technical content
+            chunk_overlap=self.config.CHUNK_OVERLAP * 2,  # More overlap
+            separators=separators
+        )
+        standard_text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.config.CHUNK_SIZE,
+            chunk_overlap=self.config.CHUNK_OVERLAP,
+            separators=separators
+        )
+
+        # Checked once, so production runs skip the per-record debug message entirely
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+
+        # Prepare documents
+        docs = []
+        for i, record in enumerate(records):
+            # Check if record has markdown content
+            if record.markdown is None:
+                self.logger.warning("Record %d missing 'markdown' field: %s", i, record)
+                continue  # Skip records without markdown
+
+            # Split content into chunks
+            if record.type == 'qa_pair':
+                # For Q&A content, don't split questions from answers
+                chunks = [record.markdown]
+            elif any(term in record.markdown.lower() for term in special_terms):
+                # For technical content, use smaller chunks with more overlap
+                chunks = technical_text_splitter.split_text(record.markdown)
+            elif record.chunks is not None:
+                # Already chunked while converting from HTML
+                chunks = record.chunks
+            else:
+                chunks = standard_text_splitter.split_text(record.markdown)
+
+            if debug:
+                self.logger.debug("Split record %s into %d chunks", record.id or record.url, len(chunks))
+
+            # Create documents with metadata
+            for j, chunk in enumerate(chunks):
+                # Get attribution metadata
+                attribution_metadata = self.enhancement_service.enrich_attribution_metadata(chunk)
+
+                # Merge with standard metadata
+                metadata = {
+                    "title": record.title,
+                    "url": record.url,
+                    "chunk": j,
+                    "source": f"{record.type}"
+                }
+                metadata.update(attribution_metadata)
+
+                # Add keywords if available
+                if record.keywords:
+                    metadata["keywords"] = record.keywords
+
+                # Create embedding prompt
+                optimized_text = self.enhancement_service.create_embedding_prompt(chunk, metadata)
+
+                doc = Document(
+                    id=f"{record.id}#{j}" if record.id else None,
+                    page_content=optimized_text,
+                    metadata=metadata
+                )
+                docs.append(doc)
+        return docs
+
+    async def aindex_documents(self, docs: List[Document], embeddings: OpenAIEmbeddings, index) -> int:
+        """
+        Embed and upsert documents in token-packed batches, overlapping the embedding calls
+        of one batch with the upserts of others. Documents with identical text are embedded once.
+
+        Args:
+            docs: Documents to index
+            embeddings: Embedding client
+            index: Pinecone gRPC index handle
+
+        Returns:
+            Number of batches that failed
+        """
+        upsert_batch_size = self.config.PINECONE_UPSERT_BATCH_SIZE
+        # Bound in-flight batches to stay within OpenAI rate limits
+        semaphore = asyncio.Semaphore(self.config.EMBEDDING_MAX_CONCURRENCY)
+
+        # Shared boilerplate (shipping, returns) repeats across records, so group documents by text
+        docs_by_text: Dict[str, List[Document]] = {}
+        for doc in docs:
+            docs_by_text.setdefault(doc.page_content, []).append(doc)
+        if len(docs_by_text) < len(docs):
+            self.logger.info("Embedding %d unique texts for %d chunks", len(docs_by_text), len(docs))
+
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+
+        async def process(batch: List[Document]) -> None:
+            async with semaphore:
+                batch_embeddings = await self.aembed_with_cache(embeddings, [doc.page_content for doc in batch])
+
+                # Store the text under "text" so PineconeVectorStore can read it back at query time
+                vectors = [
+                    {
+                        "id": doc.id or str(uuid.uuid4()),
+                        "values": embedding,
+                        "metadata": {**doc.metadata, "text": doc.page_content}
+                    }
+                    for unique_doc, embedding in zip(batch, batch_embeddings)
+                    for doc in docs_by_text[unique_doc.page_content]
+                ]
+
+                # Fire the upserts concurrently over the gRPC channel and wait for all of them
+                await asyncio.gather(*[
+                    asyncio.wrap_future(index.upsert(vectors=vectors[i:i + upsert_batch_size], async_req=True))
+                    for i in range(0, len(vectors), upsert_batch_size)
+                ])
+                if debug:
+                    self.logger.debug("Upserted %d vectors for %d unique texts", len(vectors), len(batch))
+
+        batches = self.token_batches([same_text_docs[0] for same_text_docs in docs_by_text.values()])
+        results = await asyncio.gather(*[process(batch) for batch in batches], return_exceptions=True)
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        for error in errors:
+            self.logger.error("Error indexing batch to Pinecone: %s", error)
+        return len(errors)
+
+    async def adelete_stale_vectors(self, index, record_ids: List[str],
+                                    chunk_counts: Optional[Dict[str, int]] = None) -> int:
+        """
+        Delete the chunk vectors of the given records that are no longer current.
+
+        Vector ids of the records are listed concurrently and deleted in batches.
+
+        Args:
+            index: Pinecone index handle
+            record_ids: Record ids whose {id}#{chunk} vectors should be checked
+            chunk_counts: Current number of chunks per record id; a record's vectors from this
+                chunk number on are deleted, all of them for records missing here
+
+        Returns:
+            Number of vectors deleted
+        """
+        chunk_counts = chunk_counts or {}
+        semaphore = asyncio.Semaphore(self.config.PINECONE_LIST_CONCURRENCY)
+
+        def outdated_ids(record_id: str) -> List[str]:
+            keep = chunk_counts.get(record_id, 0)
+            # The "#" terminator keeps product:1 from matching product:12
+            return [vector_id
+                    for vector_ids in index.list(prefix=f"{record_id}#")
+                    for vector_id in vector_ids
+                    if int(vector_id.rsplit("#", 1)[1]) >= keep]
+
+        async def alist(record_id: str) -> List[str]:
+            async with semaphore:
+                return await asyncio.to_thread(outdated_ids, record_id)
+
+        listed = await asyncio.gather(*[alist(record_id) for record_id in dict.fromkeys(record_ids)])
+        vector_ids = [vector_id for ids in listed for vector_id in ids]
+
+        batch_size = self.config.PINECONE_DELETE_BATCH_SIZE
+        await asyncio.gather(*[
+            asyncio.to_thread(index.delete, ids=vector_ids[i:i + batch_size])
+            for i in range(0, len(vector_ids), batch_size)
+        ])
+        return len(vector_ids)
+
+    def _token_counter(self) -> Callable[[str], int]:
+        """Get a function counting embedding model tokens, estimated if tiktoken is unavailable."""
+        model = self.config.OPENAI_EMBEDDING_MODEL
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its encodings on first use
+            self.logger.warning("Could not load tiktoken encoding for %s, estimating tokens: %s", model, e)
+            return lambda text: len(text) // 4 + 1
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    def token_batches(self, docs: List[Document]) -> List[List[Document]]:
+        """
+        Group documents into embedding batches of at most EMBEDDING_BATCH_MAX_TOKENS tokens.
+
+        Args:
+            docs: Documents to batch
+
+        Returns:
+            Batches of documents, in order
+        """
+        count_tokens = self._token_counter()
+        batches = []
+        batch: List[Document] = []
+        batch_tokens = 0
+        for doc in docs:
+            tokens = count_tokens(doc.page_content)
+            if tokens > self.config.EMBEDDING_CONTEXT_LENGTH:
+                self.logger.warning("Chunk '%s' #%s has %d tokens, more than the embedding context length",
+                                    doc.metadata.get('title'), doc.metadata.get('chunk'), tokens)
+
+            if batch and batch_tokens + tokens > self.config.EMBEDDING_BATCH_MAX_TOKENS:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(doc)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append(batch)
+        self.logger.info("Packed %d chunks into %d embedding batches", len(docs), len(batches))
+        return batches
+
+    async def aembed_with_cache(self, embeddings: OpenAIEmbeddings, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, only calling the embedding API for texts missing from the embedding cache.
+
+        Args:
+            embeddings: Embedding client used for cache misses
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text, in the same order
+        """
+        keys = [embedding_cache.generate_key(text, self.config.OPENAI_EMBEDDING_MODEL) for text in texts]
+        vectors = embedding_cache.get_many(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in vectors]
+        self.logger.info("Embedding cache hit for %d of %d chunks", len(texts) - len(missing), len(texts))
+
+        if missing:
+            new_embeddings = await embeddings.aembed_documents([texts[i] for i in missing])
+            new_vectors = {keys[i]: embedding for i, embedding in zip(missing, new_embeddings)}
+            embedding_cache.set_many(new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
@@ -0,0 +1,165 @@
+"""
+Cache service for storing and retrieving document chunk embeddings.
+"""
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from app.config import cache_config
+from app.utils.logging_utils import get_logger
+
+# Keep IN (...) clauses well below SQLite's bound parameter limit
+_QUERY_BATCH_SIZE = 500
+
+
+class EmbeddingCacheService:
+    """Service for caching chunk embeddings so unchanged content is not re-embedded."""
+
+    def __init__(self, db_path: Optional[Union[str, Path]] = None):
+        """
+        Initialize the cache service.
+
+        Args:
+            db_path: Optional path to the SQLite database, defaults to EMBEDDING_CACHE_DB_PATH
+        """
+        self.logger = get_logger(f"{__name__}.EmbeddingCacheService")
+        self.db_path = str(db_path or cache_config.EMBEDDING_CACHE_DB_PATH)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Initialize the SQLite database for the cache."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            # Vectors are stored as raw float32 bytes
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                hash TEXT PRIMARY KEY,
+                vec BLOB,
+                timestamp REAL
+            )
+            ''')
+
+            conn.commit()
+            conn.close()
+            self.logger.info(f"Embedding cache database initialized at {self.db_path}")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize embedding cache database: {e}")
+            raise
+
+    @staticmethod
+    def generate_key(text: str, model: str) -> str:
+        """
+        Generate a cache key for a chunk of text.
+
+        Args:
+            text: Exact text that is sent to the embedding model
+            model: Embedding model name, so switching models never reuses vectors
+
+        Returns:
+            SHA-256 hex digest identifying the text/model pair
+        """
+        return hashlib.sha256(f"{model}:{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Retrieve cached embeddings for the given keys.
+
+        Args:
+            keys: Keys generated by generate_key
+
+        Returns:
+            Dictionary mapping each cached, unexpired key to its embedding
+        """
+        if not cache_config.EMBEDDING_CACHE_ENABLED or not keys:
+            return {}
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            min_timestamp = time.time() - cache_config.EMBEDDING_CACHE_TTL
+            unique_keys = list(dict.fromkeys(keys))
+            found = {}
+            for i in range(0, len(unique_keys), _QUERY_BATCH_SIZE):
+                batch = unique_keys[i:i + _QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders}) AND timestamp >= ?",
+                    (*batch, min_timestamp)
+                )
+                for key, vec in cursor.fetchall():
+                    found[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+
+            conn.close()
+            return found
+
+        except Exception as e:
+            self.logger.error(f"Error retrieving from embedding cache: {e}")
+            return {}
+
+    def set_many(self, vectors: Dict[str, List[float]]) -> bool:
+        """
+        Cache embeddings for future indexing runs.
+
+        Args:
+            vectors: Dictionary mapping keys generated by generate_key to embeddings
+
+        Returns:
+            Boolean indicating success/failure
+        """
+        if not cache_config.EMBEDDING_CACHE_ENABLED or not vectors:
+            return False
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            now = time.time()
+            cursor.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vec, timestamp) VALUES (?, ?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes(), now) for key, vec in vectors.items()]
+            )
+
+            # Drop expired entries
+            cursor.execute("DELETE FROM embeddings WHERE timestamp < ?",
+                           (now - cache_config.EMBEDDING_CACHE_TTL,))
+
+            conn.commit()
+            conn.close()
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error caching embeddings: {e}")
+            return False
+
+    def clear(self) -> int:
+        """
+        Clear all cached embeddings.
+
+        Returns:
+            Number of entries cleared
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            entries = cursor.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            # noinspection SqlWithoutWhere
+            cursor.execute("DELETE FROM embeddings")
+            conn.commit()
+            conn.close()
+
+            self.logger.info(f"Cleared {entries} cached embeddings")
+            return entries
+
+        except Exception as e:
+            self.logger.error(f"Error clearing embedding cache: {e}")
+            return 0
+
+# Create singleton instance
+embedding_cache = EmbeddingCacheService()
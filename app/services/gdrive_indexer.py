@@ -1,5 +1,6 @@
 import os
 import json
+from dataclasses import asdict
 from tqdm import tqdm
 from markdownify import markdownify as md
 from typing import Callable, Dict, List, Union, Optional, Any
@@ -23,6 +24,8 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
+from app.services.content_processor import wait_for_index_ready
 from app.services.enhancement_service import enhancement_service
 
 class CustomJsonLoader(BaseLoader):
@@ -456,11 +459,11 @@ class GoogleDriveIndexer:
                     content = self.condense_content_using_llm(content)
 
                 # Create record
-                record = {
-                    'title': file['name'],
-                    'url': file.get('webViewLink', ''),
-                    'markdown': content
-                }
+                record = Record(
+                    title=file['name'],
+                    url=file.get('webViewLink', ''),
+                    markdown=content
+                )
                 records.append(record)
 
             except Exception as ex:
@@ -472,7 +475,7 @@ class GoogleDriveIndexer:
         if self.config.SAVE_INTERMEDIATE_FILES:
             processed_file = os.path.join(self.config.OUTPUT_DIR, "drive_processed.json")
             with open(processed_file, 'w') as f:
-                json.dump(records, f, indent=2)
+                json.dump([asdict(record) for record in records], f, indent=2)
 
         return records
 
@@ -511,14 +514,15 @@ class GoogleDriveIndexer:
                     region=self.config.PINECONE_REGION
                 )
             )
+            wait_for_index_ready(pc, self.config)
             self.logger.info(f"Index '{self.config.PINECONE_INDEX_NAME}' created successfully.")
 
         # Create loader for the records
         loader = CustomJsonLoader(
             records,
             dataset_mapping_function=lambda item: Document(
-                page_content=item["markdown"] or "",
-                metadata={'url': item["url"], "title": item["title"]}
+                page_content=item.markdown or "",
+                metadata={'url': item.url, "title": item.title}
             )
         )
 
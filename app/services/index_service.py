@@ -1,8 +1,10 @@
 import asyncio
 import os
-import json
 from typing import Dict, Optional, Any, List
 import logging
+
+import orjson
+import zstandard
 from pinecone import Pinecone
 
 from app.config.chat_config import ChatConfig
@@ -33,30 +35,44 @@ class IndexService:
                 indexer.config.SHOPIFY_STORE = store
 
             # Initialize Shopify client and parameters
-            setup = indexer.setup_shopify_indexer()
+            # Run in a separate thread since the indexer drives its own event loop for fetching
+            setup = await asyncio.to_thread(indexer.setup_shopify_indexer)
             if setup.get("status") != "success":
                 return setup
                 
             # Fetch all content from Shopify
             self.logger.debug("Fetching content from Shopify")
-            all_records = indexer.get_all_content()
-            self.logger.info(f"Fetched {len(all_records)} records from Shopify")
+            all_records = await asyncio.to_thread(indexer.get_all_content)
+            indexer.close()
+
+            # A new index holds nothing yet, whatever the manifest says was indexed before
+            if await asyncio.to_thread(self.content_processor.ensure_index):
+                indexer.reset_manifest()
+
+            changed_records = indexer.get_changed_records(all_records)
+            deleted_ids = indexer.get_deleted_ids()
+            stale_ids = deleted_ids + indexer.get_indexed_ids(changed_records)
+            self.logger.info(f"Fetched {len(all_records)} records from Shopify, {len(changed_records)} new or"
+                             f" changed, {len(deleted_ids)} removed")
             
             # Process and enhance records
             self.logger.debug("Processing and enhancing records")
-            enhanced_records = self.content_processor.process_records(all_records)
+            enhanced_records = self.content_processor.process_records(changed_records)
             
             # File saving is handled in the Shopify indexer
             
             # Index the enhanced records to Pinecone
             self.logger.debug("Indexing records to Pinecone")
-            success = self.content_processor.index_to_pinecone(enhanced_records)
+            success = await self.content_processor.aindex_to_pinecone(enhanced_records, stale_ids)
             
             if success:
+                # Only mark content as indexed once it is actually in Pinecone
+                indexer.save_manifest()
                 return {
                     "status": "success",
                     "message": f"Successfully indexed {len(enhanced_records)} Shopify records",
-                    "record_count": len(enhanced_records)
+                    "record_count": len(enhanced_records),
+                    "deleted_count": len(deleted_ids)
                 }
             else:
                 return {
@@ -108,7 +124,7 @@ class IndexService:
             
             # Index the enhanced records to Pinecone
             self.logger.debug("Indexing records to Pinecone")
-            success = self.content_processor.index_to_pinecone(enhanced_records)
+            success = await self.content_processor.aindex_to_pinecone(enhanced_records)
             
             if success:
                 return {
@@ -150,19 +166,12 @@ class IndexService:
                 # Try to load the Shopify content from saved files
                 content = []
                 try:
-                    # Check if product and article files exist
-                    product_path = os.path.join(self.config.OUTPUT_DIR, "products.json")
-                    article_path = os.path.join(self.config.OUTPUT_DIR, "articles.json")
-                    
-                    if os.path.exists(product_path):
-                        with open(product_path, "r") as f:
-                            products = json.load(f)
-                            content.extend(products)
-                    
-                    if os.path.exists(article_path):
-                        with open(article_path, "r") as f:
-                            articles = json.load(f)
-                            content.extend(articles)
+                    # Products and articles saved by the last Shopify indexing run
+                    if os.path.exists(self.config.SHOPIFY_CONTENT_FILE):
+                        with open(self.config.SHOPIFY_CONTENT_FILE, "rb") as f:
+                            bundle = orjson.loads(zstandard.decompress(f.read()))
+                        content.extend(bundle.get('products', []))
+                        content.extend(bundle.get('articles', []))
                 except Exception as e:
                     self.logger.warning(f"Could not load content files: {str(e)}")
                 
@@ -209,6 +218,12 @@ class IndexService:
             if self.config.PINECONE_INDEX_NAME in available_indexes:
                 # Delete the index
                 pc.delete_index(self.config.PINECONE_INDEX_NAME)
+
+                # The manifest describes what is in the index, so the next run must re-index everything
+                indexer = ShopifyIndexer(self.config)
+                indexer.reset_manifest()
+                indexer.save_manifest()
+                indexer.close()
                 return {"status": "success", "message": f"Index '{self.config.PINECONE_INDEX_NAME}' deleted successfully"}
             else:
                 return {"status": "success", "message": f"Index '{self.config.PINECONE_INDEX_NAME}' does not exist"}
@@ -5,6 +5,7 @@ import json
 from typing import Dict, List, Any, Optional
 
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
 from app.utils.llm_client import LLMClientManager
 from app.utils.logging_utils import get_logger
 from app.utils.other_utlis import load_json
@@ -269,7 +270,7 @@ class QAService:
 
         return metadata
     
-    def prepare_qa_pairs(self) -> List[Dict[str, Any]]:
+    def prepare_qa_pairs(self) -> List[Record]:
         """
         Process Q&A content to preserve question-answer relationships
 
@@ -287,27 +288,27 @@ class QAService:
 
             if "tracking" in question.lower() and "web and app" in question.lower():
                 # Add special metadata for tracking questions
-                record = {
-                    'title': f"Q&A: {question[:50]}...",
-                    'url': '#tracking-types',
-                    'markdown': f"Q: {question}\n\nA: {answer}",
-                    'type': 'qa_pair',
-                    'special_type': 'tracking_types_examples'
-                }
+                record = Record(
+                    title=f"Q&A: {question[:50]}...",
+                    url='#tracking-types',
+                    markdown=f"Q: {question}\n\nA: {answer}",
+                    type='qa_pair',
+                    special_type='tracking_types_examples'
+                )
                 qa_records.append(record)
             else:
-                record = {
-                    'title': f"Q&A: {question[:50]}...",
-                    'url': '#qa',
-                    'markdown': f"Q: {question}\n\nA: {answer}",
-                    'type': 'qa_pair'
-                }
+                record = Record(
+                    title=f"Q&A: {question[:50]}...",
+                    url='#qa',
+                    markdown=f"Q: {question}\n\nA: {answer}",
+                    type='qa_pair'
+                )
                 qa_records.append(record)
 
         return qa_records
     
-    def enhance_records_with_keywords(self, records: List[Dict[str, Any]],
-                                   keyword_map: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    def enhance_records_with_keywords(self, records: List[Record],
+                                   keyword_map: Dict[str, List[str]]) -> List[Record]:
         """
         Enhance records with keywords based on content analysis.
 
@@ -322,11 +323,11 @@ class QAService:
 
         for record in records:
             # Skip if no markdown content
-            if 'markdown' not in record:
+            if record.markdown is None:
                 enhanced_records.append(record)
                 continue
 
-            content = record['markdown'].lower()
+            content = record.markdown.lower()
             record_keywords = set()
 
             # Check for each keyword category in the content
@@ -339,7 +340,7 @@ class QAService:
 
             # Add keywords to record
             if record_keywords:
-                record['keywords'] = list(record_keywords)
+                record.keywords = list(record_keywords)
 
             enhanced_records.append(record)
 
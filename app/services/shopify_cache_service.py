@@ -0,0 +1,273 @@
+"""
+Cache service for storing and retrieving Shopify admin API responses.
+"""
+import gzip
+import json
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from app.config import cache_config
+from app.utils.logging_utils import get_logger
+
+
+class ShopifyCacheService:
+    """Service for caching Shopify API responses to avoid redundant admin API calls."""
+
+    def __init__(self, db_path: Optional[Union[str, Path]] = None):
+        """
+        Initialize the cache service.
+
+        Args:
+            db_path: Optional path to the SQLite database, defaults to SHOPIFY_CACHE_DB_PATH
+        """
+        self.logger = get_logger(f"{__name__}.ShopifyCacheService")
+        self.db_path = str(db_path or cache_config.SHOPIFY_CACHE_DB_PATH)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Initialize the SQLite database for the cache."""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            # Values are gzipped JSON payloads
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shopify_cache (
+                cache_key TEXT PRIMARY KEY,
+                payload BLOB,
+                timestamp REAL,
+                hit_count INTEGER DEFAULT 0
+            )
+            ''')
+
+            conn.commit()
+            conn.close()
+            self.logger.info(f"Shopify cache database initialized at {self.db_path}")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize Shopify cache database: {e}")
+            raise
+
+    @staticmethod
+    def generate_key(endpoint: str, url: str, params: Dict[str, Any]) -> str:
+        """
+        Generate a cache key for a Shopify GET request.
+
+        Args:
+            endpoint: Logical endpoint name (blogs, articles, products)
+            url: Full request URL, so different stores never share entries
+            params: Query parameters of the request
+
+        Returns:
+            Cache key in the form shopify:{endpoint}:{params_hash}
+        """
+        hash_content = url + json.dumps(params, sort_keys=True, default=str)
+        params_hash = hashlib.md5(hash_content.encode('utf-8')).hexdigest()
+        return f"shopify:{endpoint}:{params_hash}"
+
+    def get(self, cache_key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Retrieve a cached response.
+
+        Args:
+            cache_key: Key generated by generate_key
+            ttl: Maximum age in seconds, or None to accept stale entries
+
+        Returns:
+            The cached response, or None on a miss or expired entry
+        """
+        if not cache_config.SHOPIFY_CACHE_ENABLED:
+            return None
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT payload, timestamp FROM shopify_cache WHERE cache_key = ?",
+                (cache_key,)
+            )
+            result = cursor.fetchone()
+
+            if not result:
+                conn.close()
+                return None
+
+            payload, timestamp = result
+            if ttl is not None and time.time() - timestamp > ttl:
+                # Keep expired entries around as a fallback for failed requests
+                conn.close()
+                return None
+
+            cursor.execute(
+                "UPDATE shopify_cache SET hit_count = hit_count + 1 WHERE cache_key = ?",
+                (cache_key,)
+            )
+            conn.commit()
+            conn.close()
+
+            return json.loads(gzip.decompress(payload))
+
+        except Exception as e:
+            self.logger.error(f"Error retrieving from Shopify cache: {e}")
+            return None
+
+    def set(self, cache_key: str, value: Any) -> bool:
+        """
+        Cache a response for future retrieval.
+
+        Args:
+            cache_key: Key generated by generate_key
+            value: JSON-serializable response data
+
+        Returns:
+            Boolean indicating success/failure
+        """
+        if not cache_config.SHOPIFY_CACHE_ENABLED:
+            return False
+
+        try:
+            payload = gzip.compress(json.dumps(value).encode('utf-8'))
+
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT INTO shopify_cache (cache_key, payload, timestamp, hit_count)
+                VALUES (?, ?, ?, 0)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    timestamp = excluded.timestamp
+                """,
+                (cache_key, payload, time.time())
+            )
+
+            # Evict least frequently used entries beyond the size limit
+            if cache_config.SHOPIFY_CACHE_SIZE_LIMIT > 0:
+                total_rows = cursor.execute("SELECT COUNT(*) FROM shopify_cache").fetchone()[0]
+
+                if total_rows > cache_config.SHOPIFY_CACHE_SIZE_LIMIT:
+                    rows_to_delete = total_rows - cache_config.SHOPIFY_CACHE_SIZE_LIMIT
+                    self.logger.info(f"Shopify cache size ({total_rows}) exceeds limit"
+                                     f" ({cache_config.SHOPIFY_CACHE_SIZE_LIMIT}),"
+                                     f" evicting {rows_to_delete} least used entries")
+                    cursor.execute(
+                        """
+                        DELETE FROM shopify_cache
+                        WHERE cache_key IN (
+                            SELECT cache_key FROM shopify_cache
+                            ORDER BY hit_count, timestamp
+                            LIMIT ?
+                        )
+                        """,
+                        (rows_to_delete,)
+                    )
+
+            conn.commit()
+            conn.close()
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error caching Shopify response: {e}")
+            return False
+
+    def fetch(self, endpoint: str, url: str, params: Dict[str, Any], ttl: Optional[float],
+              request: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        Serve a Shopify GET request from the cache while fresh, otherwise make it and cache the result.
+
+        Args:
+            endpoint: Logical endpoint name (blogs, articles, products)
+            url: Full request URL
+            params: Query parameters of the request
+            ttl: Maximum age in seconds of a cached response
+            request: Makes the request, returning the parsed response or None on failure
+
+        Returns:
+            The response, the last cached response if the request failed, or None
+        """
+        cache_key, cached = self._get_fresh(endpoint, url, params, ttl)
+        if cached is not None:
+            return cached
+
+        try:
+            result = request()
+        except Exception as e:
+            self.logger.error(f"Error retrieving {endpoint}: {e}")
+            result = None
+        return self._store_or_fallback(cache_key, endpoint, result)
+
+    async def afetch(self, endpoint: str, url: str, params: Dict[str, Any], ttl: Optional[float],
+                     request: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        Async variant of fetch, for requests made with an async client.
+
+        Args:
+            endpoint: Logical endpoint name (blogs, articles, products)
+            url: Full request URL
+            params: Query parameters of the request
+            ttl: Maximum age in seconds of a cached response
+            request: Coroutine function making the request, returning the parsed response or None on failure
+
+        Returns:
+            The response, the last cached response if the request failed, or None
+        """
+        cache_key, cached = self._get_fresh(endpoint, url, params, ttl)
+        if cached is not None:
+            return cached
+
+        try:
+            result = await request()
+        except Exception as e:
+            self.logger.error(f"Error retrieving {endpoint}: {e}")
+            result = None
+        return self._store_or_fallback(cache_key, endpoint, result)
+
+    def _get_fresh(self, endpoint: str, url: str, params: Dict[str, Any],
+                   ttl: Optional[float]) -> Tuple[str, Optional[Any]]:
+        """Look up a fresh cached response, returning (cache_key, response or None on a miss)."""
+        cache_key = self.generate_key(endpoint, url, params)
+        cached = self.get(cache_key, ttl=ttl)
+        if cached is not None:
+            self.logger.info(f"Using {len(cached)} cached {endpoint} for {url}")
+        return cache_key, cached
+
+    def _store_or_fallback(self, cache_key: str, endpoint: str, result: Optional[Any]) -> Optional[Any]:
+        """Cache a successful response, or fall back to the last cached one, even if expired."""
+        if result is not None:
+            self.set(cache_key, result)
+            return result
+
+        stale = self.get(cache_key)
+        if stale is not None:
+            self.logger.warning(f"Falling back to {len(stale)} stale cached {endpoint}")
+        return stale
+
+    def clear(self) -> int:
+        """
+        Clear all cached Shopify responses.
+
+        Returns:
+            Number of entries cleared
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            entries = cursor.execute("SELECT COUNT(*) FROM shopify_cache").fetchone()[0]
+            # noinspection SqlWithoutWhere
+            cursor.execute("DELETE FROM shopify_cache")
+            conn.commit()
+            conn.close()
+
+            self.logger.info(f"Cleared {entries} Shopify cache entries")
+            return entries
+
+        except Exception as e:
+            self.logger.error(f"Error clearing Shopify cache: {e}")
+            return 0
+
+# Create singleton instance
+shopify_cache = ShopifyCacheService()
@@ -6,22 +6,25 @@ This module provides functionality to fetch content from Shopify (products and b
 and index it to a vector database (Pinecone) for RAG applications.
 """
 
+import asyncio
 import os
-import json
-import requests
-import time
-from typing import List, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain.docstore.document import Document
-from pinecone import Pinecone, ServerlessSpec
-import markdownify as md
+import httpx
+import orjson
+import zstandard
 
+from app.config import cache_config
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
+from app.services.content_processor import ContentProcessor
 from app.services.enhancement_service import enhancement_service
+from app.services.shopify_cache_service import shopify_cache
+from app.utils import markdown_converter
 from app.utils.logging_utils import get_logger
 
+
 class ShopifyIndexer:
     """
     Shopify content indexer for RAG applications.
@@ -43,55 +46,164 @@ class ShopifyIndexer:
         self.shopify_admin_api_base = (f"https://{self.config.SHOPIFY_SHOP_DOMAIN}"
                                        f"/admin/api/{self.config.SHOPIFY_API_VERSION}")
 
+        # Shared HTTP client so every request reuses pooled keep-alive connections
+        self._session = httpx.Client(http2=True,
+                                     base_url=self.shopify_admin_api_base,
+                                     headers=self._auth_headers())
+
         # Use the enhancement service
         self.enhancement_service = enhancement_service
 
+        # Updated_at of every record in the last successful run against the configured index, and of
+        # every record in this pull, by the request the records came from
+        self.manifest = self._load_manifest()
+        self._pulled: Dict[str, Dict[str, Optional[str]]] = {}
+
         # logging
-        self.logger.info(f"ShopifyIndexer initialized with shop domain: {self.config.SHOPIFY_SHOP_DOMAIN}")
+        self.logger.info("ShopifyIndexer initialized with shop domain: %s", self.config.SHOPIFY_SHOP_DOMAIN)
 
-    def get_blogs(self) -> List[Dict[str, Any]]:
+    def _auth_headers(self) -> Dict[str, str]:
+        """Headers authenticating requests against the Shopify admin API."""
+        return {'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY or ''}
+
+    def close(self) -> None:
+        """Close the shared HTTP client."""
+        self._session.close()
+
+    def _read_manifests(self) -> Dict[str, Dict[str, Dict[str, Optional[str]]]]:
+        """Read the manifests of every index, or none if no manifest was saved yet."""
+        try:
+            with open(self.config.INDEX_MANIFEST_FILE, "rb") as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning("Could not load index manifest, re-indexing all content: %s", e)
+            return {}
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """Load the manifest of records indexed to the configured index, grouped by the request they came from."""
+        return self._read_manifests().get(self.config.PINECONE_INDEX_NAME, {})
+
+    def _track(self, source: str, record_id: str, updated_at: Optional[str]) -> None:
         """
-        Get all blogs from Shopify store.
-        
+        Record a pulled item.
+
+        Args:
+            source: Request the item came from: blogs, products, or articles:{blog_id}
+            record_id: Record id in the form {type}:{shopify_id}
+            updated_at: Shopify updated_at of the item
+        """
+        self._pulled.setdefault(source, {})[record_id] = updated_at
+
+    def _indexed_versions(self) -> Dict[str, Optional[str]]:
+        """Map every record id in the manifest to the updated_at it was indexed at."""
+        return {record_id: updated_at
+                for records in self.manifest.values()
+                for record_id, updated_at in records.items()}
+
+    def _is_removed_source(self, source: str) -> bool:
+        """Check whether a source in the manifest holds the articles of a blog that is gone from the store."""
+        kind, _, blog_id = source.partition(':')
+        return (kind == 'articles'
+                and 'blogs' in self._pulled
+                and f"blog:{blog_id}" not in self._pulled['blogs'])
+
+    def reset_manifest(self) -> None:
+        """Forget which records were indexed, e.g. because the index was just created, so all are indexed again."""
+        self.manifest = {}
+
+    def get_changed_records(self, records: List[Record]) -> List[Record]:
+        """
+        Select the records that need indexing. With INCREMENTAL_INDEXING enabled, records
+        already indexed at their current updated_at are left out.
+
+        Args:
+            records: Content records returned by get_all_content
+
         Returns:
-            List of blog objects containing id, handle, title, and updated_at
+            New or changed records
         """
-        try:
-            # Log the URL and API key (masked) being used
-            masked_key = "***" + self.config.SHOPIFY_API_KEY[-4:] if self.config.SHOPIFY_API_KEY else "None"
-            self.logger.info(f"Fetching blogs from {self.shopify_admin_api_base}/blogs.json with API key: {masked_key}")
-
-            url = f"{self.shopify_admin_api_base}/blogs.json"
-            params = {
-                'fields': 'id,updated_at,handle,title',
-                'limit': self.config.BLOG_FETCH_LIMIT
-            }
-            headers = {
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
-            }
+        if not self.config.INCREMENTAL_INDEXING:
+            return records
+
+        indexed = self._indexed_versions()
+        changed = [record for record in records
+                   if record.updated_at is None or indexed.get(record.id) != record.updated_at]
+        self.logger.info("%d of %d records changed since the last index run", len(changed), len(records))
+        return changed
 
-            # Log the full request details (except API key)
-            self.logger.info(f"Request: GET {url} with params={params}")
+    def get_indexed_ids(self, records: List[Record]) -> List[str]:
+        """
+        Get ids of records that already have vectors in the index from an earlier run.
+
+        Args:
+            records: Records about to be indexed
 
-            response = requests.get(url=url, params=params, headers=headers)
+        Returns:
+            Record ids whose old vectors should be replaced
+        """
+        indexed = self._indexed_versions()
+        return [record.id for record in records if record.id in indexed]
 
-            if response.status_code == 200:
-                data = json.loads(response.content)
-                blogs = data.get('blogs', [])
-                self.logger.info(f"Retrieved {len(blogs)} blogs from Shopify")
-                # Log first blog for debugging if any exist
-                if blogs:
-                    self.logger.info(f"First blog: {blogs[0]}")
-                return blogs
-            else:
-                self.logger.error(f"Failed to get blogs: Status code {response.status_code}")
-                self.logger.error(f"Response content: {response.content}")
-                return []
+    def get_deleted_ids(self) -> List[str]:
+        """
+        Get ids of indexed records that are missing from the latest pull. Only requests that
+        succeeded count, so records behind a failed request are never reported as deleted.
 
-        except Exception as e:
-            self.logger.error(f"Error retrieving blogs: {str(e)}")
+        Returns:
+            Record ids whose vectors should be removed from the index
+        """
+        deleted = []
+        for source, records in self.manifest.items():
+            if source in self._pulled:
+                deleted.extend(record_id for record_id in records if record_id not in self._pulled[source])
+            elif self._is_removed_source(source):
+                deleted.extend(records)
+        return deleted
+
+    def save_manifest(self) -> None:
+        """Persist the pulled records as indexed. Call only once indexing has succeeded."""
+        manifest = {source: records for source, records in self.manifest.items()
+                    if source not in self._pulled and not self._is_removed_source(source)}
+        manifest.update(self._pulled)
+
+        manifests = self._read_manifests()
+        manifests[self.config.PINECONE_INDEX_NAME] = manifest
+        os.makedirs(os.path.dirname(self.config.INDEX_MANIFEST_FILE) or ".", exist_ok=True)
+        with open(self.config.INDEX_MANIFEST_FILE, "wb") as f:
+            f.write(orjson.dumps(manifests, option=orjson.OPT_INDENT_2))
+        self.manifest = manifest
+        self.logger.info("Saved index manifest with %d records", sum(len(records) for records in manifest.values()))
+
+    def get_blogs(self) -> List[Dict[str, Any]]:
+        """
+        Get all blogs from Shopify store.
+        
+        Returns:
+            List of blog objects containing id, handle, title, and updated_at
+        """
+        # Log the URL and API key (masked) being used
+        masked_key = "***" + self.config.SHOPIFY_API_KEY[-4:] if self.config.SHOPIFY_API_KEY else "None"
+        self.logger.info("Fetching blogs from %s/blogs.json with API key: %s",
+                         self.shopify_admin_api_base, masked_key)
+
+        path = "/blogs.json"
+        params = {
+            'fields': 'id,updated_at,handle,title',
+            'limit': self.config.BLOG_FETCH_LIMIT
+        }
+        blogs = shopify_cache.fetch('blogs', f"{self.shopify_admin_api_base}{path}", params,
+                                    cache_config.SHOPIFY_CACHE_TTL_NORMAL,
+                                    lambda: self._parse_response(self._session.get(path, params=params), 'blogs'))
+        if blogs is None:
             return []
 
+        # Log first blog for debugging if any exist
+        if blogs:
+            self.logger.info("First blog: %s", blogs[0])
+        return blogs
+
     def get_articles(self, blog_id: int) -> List[Dict[str, Any]]:
         """
         Get all articles for a specific blog.
@@ -102,32 +214,43 @@ class ShopifyIndexer:
         Returns:
             List of article objects
         """
-        try:
-            url = f"{self.shopify_admin_api_base}/blogs/{blog_id}/articles.json"
-            params = {
-                'status': 'active',
-                'published_status': 'published',
-                'fields': 'id,blog_id,updated_at,title,body_html,handle,author',
-                'limit': self.config.ARTICLE_FETCH_LIMIT
-            }
-            headers = {
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
-            }
+        path, params = self._articles_request(blog_id)
+        articles = shopify_cache.fetch('articles', f"{self.shopify_admin_api_base}{path}", params,
+                                       cache_config.SHOPIFY_CACHE_TTL_SHORT,
+                                       lambda: self._parse_response(self._session.get(path, params=params),
+                                                                    'articles'))
+        return articles if articles is not None else []
+
+    async def _aget_articles(self, client: httpx.AsyncClient, blog_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Async variant of get_articles that reuses a shared client so that
+        articles for several blogs can be fetched concurrently.
+
+        Args:
+            client: Shared httpx async client
+            blog_id: The Shopify blog ID
 
-            response = requests.get(url=url, params=params, headers=headers)
+        Returns:
+            List of article objects, or None if the request failed and nothing was cached
+        """
+        path, params = self._articles_request(blog_id)
 
-            if response.status_code == 200:
-                data = json.loads(response.content)
-                articles = data.get('articles', [])
-                self.logger.info(f"Retrieved {len(articles)} articles for blog ID {blog_id}")
-                return articles
-            else:
-                self.logger.error(f"Failed to get articles: Status code {response.status_code}")
-                return []
+        async def request() -> Optional[List[Dict[str, Any]]]:
+            return self._parse_response(await client.get(path, params=params), 'articles')
 
-        except Exception as e:
-            self.logger.error(f"Error retrieving articles: {str(e)}")
-            return []
+        return await shopify_cache.afetch('articles', f"{self.shopify_admin_api_base}{path}", params,
+                                          cache_config.SHOPIFY_CACHE_TTL_SHORT, request)
+
+    def _articles_request(self, blog_id: int) -> Tuple[str, Dict[str, Any]]:
+        """Path and query parameters of the articles request for a blog."""
+        path = f"/blogs/{blog_id}/articles.json"
+        params = {
+            'status': 'active',
+            'published_status': 'published',
+            'fields': 'id,blog_id,updated_at,title,body_html,handle,author',
+            'limit': self.config.ARTICLE_FETCH_LIMIT
+        }
+        return path, params
 
     def get_products(self) -> List[Dict[str, Any]]:
         """
@@ -136,45 +259,50 @@ class ShopifyIndexer:
         Returns:
             List of product objects
         """
-        try:
-            # Log the URL and API key (masked) being used
-            masked_key = "***" + self.config.SHOPIFY_API_KEY[-4:] if self.config.SHOPIFY_API_KEY else "None"
-            self.logger.info(
-                f"Fetching products from {self.shopify_admin_api_base}/products.json with API key: {masked_key}")
-
-            url = f"{self.shopify_admin_api_base}/products.json"
-            params = {
-                'status': 'active',
-                'published_status': 'published',
-                'fields': 'id,updated_at,title,body_html,handle',
-                'presentment_currencies': 'USD',
-                'limit': self.config.PRODUCT_FETCH_LIMIT
-            }
-            headers = {
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
-            }
+        # Log the URL and API key (masked) being used
+        masked_key = "***" + self.config.SHOPIFY_API_KEY[-4:] if self.config.SHOPIFY_API_KEY else "None"
+        self.logger.info("Fetching products from %s/products.json with API key: %s",
+                         self.shopify_admin_api_base, masked_key)
+
+        path = "/products.json"
+        params = {
+            'status': 'active',
+            'published_status': 'published',
+            'fields': 'id,updated_at,title,body_html,handle',
+            'presentment_currencies': 'USD',
+            'limit': self.config.PRODUCT_FETCH_LIMIT
+        }
+        products = shopify_cache.fetch('products', f"{self.shopify_admin_api_base}{path}", params,
+                                       cache_config.SHOPIFY_CACHE_TTL_NORMAL,
+                                       lambda: self._parse_response(self._session.get(path, params=params),
+                                                                    'products'))
+        if products is None:
+            return []
 
-            # Log the full request details (except API key)
-            self.logger.info(f"Request: GET {url} with params={params}")
+        # Log first product for debugging if any exist
+        if products:
+            self.logger.info("First product: %s (ID: %s)", products[0]['title'], products[0]['id'])
+        return products
 
-            response = requests.get(url=url, params=params, headers=headers)
+    def _parse_response(self, response: httpx.Response, endpoint: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Parse a Shopify list response.
 
-            if response.status_code == 200:
-                data = json.loads(response.content)
-                products = data.get('products', [])
-                self.logger.info(f"Retrieved {len(products)} products from Shopify")
-                # Log first product for debugging if any exist
-                if products:
-                    self.logger.info(f"First product: {products[0]['title']} (ID: {products[0]['id']})")
-                return products
-            else:
-                self.logger.error(f"Failed to get products: Status code {response.status_code}")
-                self.logger.error(f"Response content: {response.content}")
-                return []
+        Args:
+            response: Response of a GET request
+            endpoint: Endpoint name, also the key holding the listed objects
 
-        except Exception as e:
-            self.logger.error(f"Error retrieving products: {str(e)}")
-            return []
+        Returns:
+            The listed objects, or None if the request failed
+        """
+        if response.status_code != 200:
+            self.logger.error("Failed to get %s: Status code %s", endpoint, response.status_code)
+            self.logger.error("Response content: %s", response.content)
+            return None
+
+        items = orjson.loads(response.content).get(endpoint, [])
+        self.logger.info("Retrieved %d %s from Shopify", len(items), endpoint)
+        return items
 
     def html_to_markdown(self, html_content: str) -> str:
         """
@@ -184,24 +312,44 @@ class ShopifyIndexer:
             html_content: HTML content to convert
             
         Returns:
-            Markdown string
+            Markdown string, or the original content if conversion fails
         """
-        try:
-            # Convert HTML to markdown
-            markdown_content = md.markdownify(html_content)
+        [(markdown_content, _)] = self.convert_html_many([html_content])
+        return markdown_content
 
-            # If configured, summarize long content
-            if self.config.SUMMARIZE_CONTENT and len(markdown_content) > self.config.SUMMARIZE_THRESHOLD:
-                # For this implementation, we're just returning as-is
-                # You could add a summarization step here using OpenAI or another tool
-                pass
+    def convert_html_many(self, html_contents: List[str]) -> List[Tuple[str, Optional[List[str]]]]:
+        """
+        Convert many HTML documents to markdown chunked for indexing, spreading large batches
+        over worker processes.
 
-            return markdown_content
+        Args:
+            html_contents: HTML content to convert
 
-        except Exception as e:
-            self.logger.error(f"Error converting HTML to markdown: {str(e)}")
-            # Return original content if conversion fails
-            return html_content
+        Returns:
+            (markdown, chunks) tuples, in the same order
+        """
+        chunk_sizes = [self.config.CHUNK_SIZE] * len(html_contents)
+        overlaps = [self.config.CHUNK_OVERLAP] * len(html_contents)
+
+        results = None
+        # Worker start-up costs more than converting a handful of records
+        if len(html_contents) >= self.config.PARALLEL_CONVERSION_MIN_RECORDS:
+            try:
+                with ProcessPoolExecutor(max_workers=self.config.CONVERSION_MAX_WORKERS) as executor:
+                    results = list(executor.map(markdown_converter.convert_html, html_contents, chunk_sizes,
+                                                overlaps, chunksize=16))
+            except Exception as e:
+                self.logger.error("Error converting HTML in worker processes, converting serially: %s", e)
+        if results is None:
+            results = list(map(markdown_converter.convert_html, html_contents, chunk_sizes, overlaps))
+
+        converted = []
+        for markdown_content, chunks, error in results:
+            if chunks is None:
+                # The original HTML is indexed instead, chunked by the indexing step
+                self.logger.error("Error converting HTML to markdown: %s", error)
+            converted.append((markdown_content, chunks))
+        return converted
 
     def extract_keywords_from_qa(self) -> Dict[str, List[str]]:
         """
@@ -213,8 +361,8 @@ class ShopifyIndexer:
         # Use the enhancement service to extract keywords
         return self.enhancement_service.extract_keywords_from_qa()
 
-    def enhance_records_with_keywords(self, records: List[Dict[str, Any]],
-                                      keyword_map: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    def enhance_records_with_keywords(self, records: List[Record],
+                                      keyword_map: Dict[str, List[str]]) -> List[Record]:
         """
         Enhance records with keywords based on content analysis.
 
@@ -228,13 +376,17 @@ class ShopifyIndexer:
         # Use the enhancement service to enhance records with keywords
         return self.enhancement_service.enhance_records_with_keywords(records, keyword_map)
 
-    def get_all_content(self) -> List[Dict[str, Any]]:
+    def get_all_content(self) -> List[Record]:
         """
         Get all Shopify content (blogs, articles, products).
 
+        Every pulled record is returned, so saved files and counts describe the whole
+        catalog; see get_changed_records for the records that need indexing.
+
         Returns:
             List of all content records
         """
+        self._pulled = {}
         try:
             self.logger.info("Fetching all Shopify content...")
 
@@ -248,81 +400,135 @@ class ShopifyIndexer:
 
             # Combine all records
             all_records = blog_records + article_records + product_records + variant_records
-            self.logger.info(f"Fetched {len(all_records)} total records")
+            self.logger.info("Fetched %d total records", len(all_records))
             
             # Save intermediate files if configured
             if self.config.SAVE_INTERMEDIATE_FILES:
-                os.makedirs(self.config.OUTPUT_DIR, exist_ok=True)
-                
-                with open(os.path.join(self.config.OUTPUT_DIR, "blogs.json"), "w") as f:
-                    blog_data = [r for r in all_records if r.get('type') == 'blog']
-                    json.dump(blog_data, f, indent=2)
-                
-                with open(os.path.join(self.config.OUTPUT_DIR, "articles.json"), "w") as f:
-                    article_data = [r for r in all_records if r.get('type') == 'article']
-                    json.dump(article_data, f, indent=2)
-                
-                with open(os.path.join(self.config.OUTPUT_DIR, "products.json"), "w") as f:
-                    product_data = [r for r in all_records if r.get('type') == 'product']
-                    json.dump(product_data, f, indent=2)
-            
+                self.save_content_bundle(all_records)
+
             return all_records
 
         except Exception as e:
-            self.logger.error(f"Error fetching Shopify content: {str(e)}")
+            self.logger.error("Error fetching Shopify content: %s", e)
+            # Nothing from a partial pull may be marked as indexed or counted as deleted
+            self._pulled = {}
             return []
 
-    def prepare_blog_articles(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    def save_content_bundle(self, records: List[Record]) -> None:
+        """
+        Save fetched blogs, articles and products as one zstd-compressed JSON file.
+
+        Args:
+            records: Content records returned by get_all_content
+        """
+        def fields(record: Record) -> Dict[str, Any]:
+            # Chunks and enhancement metadata only matter for indexing and would bloat the file
+            return {
+                'id': record.id,
+                'title': record.title,
+                'url': record.url,
+                'markdown': record.markdown,
+                'type': record.type,
+                'updated_at': record.updated_at
+            }
+
+        bundle = {
+            'blogs': [fields(r) for r in records if r.type == 'blog'],
+            'articles': [fields(r) for r in records if r.type == 'article'],
+            'products': [fields(r) for r in records if r.type == 'product']
+        }
+        os.makedirs(os.path.dirname(self.config.SHOPIFY_CONTENT_FILE) or '.', exist_ok=True)
+        with open(self.config.SHOPIFY_CONTENT_FILE, "wb") as f:
+            f.write(zstandard.compress(orjson.dumps(bundle)))
+
+    def prepare_blog_articles(self) -> Tuple[List[Record], List[Record]]:
         """
         Prepare blog articles for indexing.
         
+        Returns:
+            Tuple of (blog_records, article_records)
+        """
+        return asyncio.run(self.aprepare_blog_articles())
+
+    async def aprepare_blog_articles(self) -> Tuple[List[Record], List[Record]]:
+        """
+        Prepare blog articles for indexing, fetching the articles of all blogs concurrently.
+
         Returns:
             Tuple of (blog_records, article_records)
         """
         blogs = self.get_blogs()
         all_blog_records = []
         all_article_records = []
+        article_html = []
+
+        # The getter also returns an empty list on failure, so only blogs actually listed count as pulled
+        if blogs:
+            self._pulled.setdefault('blogs', {})
+
+        # Fetch articles for every blog in parallel over a single pooled client
+        async with httpx.AsyncClient(http2=True,
+                                     base_url=self.shopify_admin_api_base,
+                                     headers=self._auth_headers(),
+                                     limits=httpx.Limits(max_connections=20)) as client:
+            articles_per_blog = await asyncio.gather(
+                *[self._aget_articles(client, blog.get('id')) for blog in blogs]
+            )
 
-        for blog in blogs:
-            blog_id = blog.get('id')
+        for blog, articles in zip(blogs, articles_per_blog):
             blog_handle = blog.get('handle')
             blog_title = blog.get('title')
 
             # Create blog record
+            blog_id = f"blog:{blog.get('id')}"
+            self._track('blogs', blog_id, blog.get('updated_at'))
             blog_url = f"{self.config.SHOPIFY_SITE_BASE_URL}/blogs/{blog_handle}"
-            blog_record = {
-                'title': blog_title,
-                'url': blog_url,
-                'type': 'blog',
-                'markdown': f"Blog: {blog_title}"  # Add minimal markdown content for indexing
-            }
+            blog_record = Record(
+                id=blog_id,
+                title=blog_title,
+                url=blog_url,
+                type='blog',
+                markdown=f"Blog: {blog_title}",  # Add minimal markdown content for indexing
+                updated_at=blog.get('updated_at')
+            )
             all_blog_records.append(blog_record)
 
-            # Get articles for this blog
-            articles = self.get_articles(blog_id)
+            if articles is None:
+                # Articles of this blog couldn't be fetched, they keep what was indexed before
+                continue
 
+            source = f"articles:{blog.get('id')}"
+            self._pulled.setdefault(source, {})
             for article in articles:
+                article_id = f"article:{article.get('id')}"
+                self._track(source, article_id, article.get('updated_at'))
+
                 article_handle = article.get('handle')
                 article_title = article.get('title')
-                article_body_html = article.get('body_html', '')
 
-                # Convert HTML to markdown
-                article_markdown = self.html_to_markdown(article_body_html)
-
-                # Create article record
+                # Create article record, its markdown and chunks are converted for all articles at once below
                 article_url = f"{self.config.SHOPIFY_SITE_BASE_URL}/blogs/{blog_handle}/{article_handle}"
-                article_record = {
-                    'title': article_title,
-                    'url': article_url,
-                    'markdown': article_markdown,
-                    'type': 'article'
-                }
+                article_record = Record(
+                    id=article_id,
+                    title=article_title,
+                    url=article_url,
+                    markdown=None,
+                    type='article',
+                    updated_at=article.get('updated_at')
+                )
                 all_article_records.append(article_record)
+                article_html.append(article.get('body_html', ''))
+
+        # Convert HTML to markdown, chunked in the same pass so indexing doesn't re-split it
+        for article_record, (article_markdown, article_chunks) in zip(all_article_records,
+                                                                       self.convert_html_many(article_html)):
+            article_record.markdown = article_markdown
+            article_record.chunks = article_chunks
 
-        self.logger.info(f"Prepared {len(all_blog_records)} blogs and {len(all_article_records)} articles")
+        self.logger.info("Prepared %d blogs and %d articles", len(all_blog_records), len(all_article_records))
         return all_blog_records, all_article_records
 
-    def prepare_products(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    def prepare_products(self) -> Tuple[List[Record], List[Record]]:
         """
         Prepare products for indexing.
         
@@ -332,28 +538,41 @@ class ShopifyIndexer:
         products = self.get_products()
         all_product_records = []
         all_variant_records = []
+        product_html = []
+
+        # The getter also returns an empty list on failure, so only products actually listed count as pulled
+        if products:
+            self._pulled.setdefault('products', {})
 
         for product in products:
+            product_id = f"product:{product.get('id')}"
+            self._track('products', product_id, product.get('updated_at'))
+
             product_handle = product.get('handle')
             product_title = product.get('title')
-            product_body_html = product.get('body_html', '')
 
-            # Convert HTML to markdown
-            product_markdown = self.html_to_markdown(product_body_html)
-
-            # Create product record
+            # Create product record, its markdown and chunks are converted for all products at once below
             product_url = f"{self.config.SHOPIFY_SITE_BASE_URL}/products/{product_handle}"
-            product_record = {
-                'title': product_title,
-                'url': product_url,
-                'markdown': product_markdown,
-                'type': 'product'
-            }
+            product_record = Record(
+                id=product_id,
+                title=product_title,
+                url=product_url,
+                markdown=None,
+                type='product',
+                updated_at=product.get('updated_at')
+            )
             all_product_records.append(product_record)
+            product_html.append(product.get('body_html', ''))
 
             # Future: add variant records if needed
 
-        self.logger.info(f"Prepared {len(all_product_records)} products")
+        # Convert HTML to markdown, chunked in the same pass so indexing doesn't re-split it
+        for product_record, (product_markdown, product_chunks) in zip(all_product_records,
+                                                                       self.convert_html_many(product_html)):
+            product_record.markdown = product_markdown
+            product_record.chunks = product_chunks
+
+        self.logger.info("Prepared %d products", len(all_product_records))
         return all_product_records, all_variant_records
 
     def create_embedding_prompt(self, text: str, metadata: Dict[str, Any] = None) -> str:
@@ -370,9 +589,25 @@ class ShopifyIndexer:
         # Use the enhancement service to create an optimized embedding prompt
         return self.enhancement_service.create_embedding_prompt(text, metadata)
 
-    def index_to_pinecone(self, records: List[Dict[str, Any]]) -> bool:
+    def index_to_pinecone(self, records: List[Record]) -> bool:
+        """
+        Index content records to Pinecone vector database from synchronous code.
+        Callers already running in an event loop should await aindex_to_pinecone instead.
+
+        Args:
+            records: List of content records with title, url, and markdown
+
+        Returns:
+            True if indexing was successful, False otherwise
+        """
+        return asyncio.run(self.aindex_to_pinecone(records))
+
+    async def aindex_to_pinecone(self, records: List[Record]) -> bool:
         """
         Index content records to Pinecone vector database.
+
+        Vectors from earlier runs of the given records are replaced, and vectors of records
+        removed from the store are deleted.
         
         Args:
             records: List of content records with title, url, and markdown
@@ -380,156 +615,8 @@ class ShopifyIndexer:
         Returns:
             True if indexing was successful, False otherwise
         """
-        try:
-            # If no records, return success
-            if not records:
-                self.logger.warning("No records to index")
-                return True
-
-            self.logger.info(f"Indexing {len(records)} records to Pinecone index '{self.config.PINECONE_INDEX_NAME}'")
-
-            # Initialize Pinecone
-            pc = Pinecone(api_key=self.config.PINECONE_API_KEY)
-
-            # Check if index exists
-            existing_indexes = pc.list_indexes().names()
-
-            # Create index if it doesn't exist
-            if self.config.PINECONE_INDEX_NAME not in existing_indexes:
-                self.logger.info(f"Creating new Pinecone index: {self.config.PINECONE_INDEX_NAME}")
-
-                pc.create_index(
-                    name=self.config.PINECONE_INDEX_NAME,
-                    dimension=self.config.PINECONE_DIMENSION,
-                    metric="cosine",
-                    spec=ServerlessSpec(
-                        cloud=self.config.PINECONE_CLOUD,
-                        region=self.config.PINECONE_REGION
-                    )
-                )
-
-                # Wait for index to initialize
-                self.logger.info("Waiting for index to initialize...")
-                time.sleep(10)
-            else:
-                self.logger.info(f"Using existing Pinecone index: {self.config.PINECONE_INDEX_NAME}")
-
-            # Prepare documents
-            docs = []
-            for i, record in enumerate(records):
-                # Check if record has markdown content
-                if 'markdown' not in record:
-                    self.logger.warning(f"Record {i} missing 'markdown' field: {record}")
-                    continue  # Skip records without markdown
-
-                # Split content into chunks
-                if record.get('type') == 'qa_pair':
-                    # For Q&A content, don't split questions from answers
-                    chunks = [record['markdown']]
-                else:
-                    #Define special technical terms to preserve
-                    special_terms = [
-                        "advanced attribution multiplier",
-                        "attribution multiplier",
-                        "marketing mix modeling",
-                        # Add other multi-word technical terms
-                    ]
-
-                    # Create a custom separator pattern that preserves these terms
-                    separators = ["\n\n", "\n", ". ", " ", ""]
-
-                    # For technical content, use smaller chunks with more overlap
-                    if any(term in record['markdown'].lower() for term in special_terms):
-                        text_splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=self.config.CHUNK_SIZE // 2,  # Smaller chunks for technical content
-                            chunk_overlap=self.config.CHUNK_OVERLAP * 2,  # More overlap
-                            separators=separators
-                        )
-                    else:
-                        text_splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=self.config.CHUNK_SIZE,
-                            chunk_overlap=self.config.CHUNK_OVERLAP,
-                            separators=separators
-                        )
-                    chunks = text_splitter.split_text(record['markdown'])
-
-                # Create documents with metadata
-                for j, chunk in enumerate(chunks):
-                    # Get attribution metadata
-                    attribution_metadata = self.enrich_attribution_metadata(chunk)
-
-                    # Merge with standard metadata
-                    metadata = {
-                        "title": record['title'],
-                        "url": record['url'],
-                        "chunk": j,
-                        "source": f"{record.get('type', 'content')}"
-                    }
-                    metadata.update(attribution_metadata)
-
-                    # Add keywords if available
-                    if 'keywords' in record:
-                        metadata["keywords"] = record['keywords']
-
-                    doc = Document(
-                        page_content=chunk,
-                        metadata=metadata
-                    )
-                    docs.append(doc)
-
-            # Initialize embeddings
-            # text-embedding-ada-002 has fixed dimensions of 1536, don't specify dimensions
-            embeddings = OpenAIEmbeddings(  # pylint: disable=unexpected-keyword-arg
-                api_key=self.config.OPENAI_API_KEY,
-                model=self.config.OPENAI_EMBEDDING_MODEL,
-                embedding_ctx_length=self.config.EMBEDDING_CONTEXT_LENGTH,
-                show_progress_bar=True
-            )
-
-            # Index documents
-            self.logger.info(f"Indexing {len(docs)} document chunks to Pinecone...")
-
-            # Create custom embeddings with enhanced prompts
-            texts = []
-            metadata_list = []
-            for doc in docs:
-                texts.append(self.create_embedding_prompt(doc.page_content, doc.metadata))
-                metadata_list.append(doc.metadata)
-
-            # Generate embeddings
-            embeddings_array = embeddings.embed_documents(texts)
-
-            # Get the Pinecone index
-            index = pc.Index(self.config.PINECONE_INDEX_NAME)
-
-            # Batch size for uploads
-            batch_size = 100
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                batch_embeddings = embeddings_array[i:i + batch_size]
-                batch_metadata_list = metadata_list[i:i + batch_size]
-
-                # Create vector records
-                vectors = []
-                for j, (text, embedding, metadata) in enumerate(
-                        zip(batch_texts, batch_embeddings, batch_metadata_list)):
-                    vectors.append({
-                        "id": f"doc_{i + j}",
-                        "values": embedding,
-                        "metadata": {**metadata, "text": text}
-                    })
-
-                # Upsert vectors to Pinecone
-                index.upsert(vectors=vectors)
-
-            self.logger.info(f"Successfully indexed {len(texts)} documents with custom embeddings")
-
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Error indexing to Pinecone: {str(e)}")
-            return False
-
+        stale_ids = self.get_deleted_ids() + self.get_indexed_ids(records)
+        return await ContentProcessor(self.config).aindex_to_pinecone(records, stale_ids)
 
     def enrich_attribution_metadata(self, content: str) -> Dict[str, Any]:
         """
@@ -563,7 +650,7 @@ class ShopifyIndexer:
             # Update SHOPIFY_SHOP_DOMAIN with the value from either attribute
             self.config.SHOPIFY_SHOP_DOMAIN = shop_domain
 
-            self.logger.info(f"Initializing Shopify client for store: {shop_domain}")
+            self.logger.info("Initializing Shopify client for store: %s", shop_domain)
 
             # Check if we have a valid Shopify domain
             if not shop_domain:
@@ -583,12 +670,13 @@ class ShopifyIndexer:
 
             # Update the API base URL with the proper domain
             self.shopify_admin_api_base = f"https://{shop_domain}/admin/api/{self.config.SHOPIFY_API_VERSION}"
-            self.logger.info(f"Updated API base URL: {self.shopify_admin_api_base}")
+            self._session.base_url = self.shopify_admin_api_base
+            self.logger.info("Updated API base URL: %s", self.shopify_admin_api_base)
 
             # Set site base URL if not already set
             if not self.config.SHOPIFY_SITE_BASE_URL:
                 self.config.SHOPIFY_SITE_BASE_URL = f"https://{shop_domain}"
-                self.logger.info(f"Updated site base URL: {self.config.SHOPIFY_SITE_BASE_URL}")
+                self.logger.info("Updated site base URL: %s", self.config.SHOPIFY_SITE_BASE_URL)
 
             # Get content count for verification
             content = self.get_all_content()
@@ -600,14 +688,14 @@ class ShopifyIndexer:
             }
 
         except Exception as e:
-            self.logger.error(f"Error in run_full_process: {str(e)}")
+            self.logger.error("Error in run_full_process: %s", e)
             return {
                 "status": "error",
                 "message": str(e)
             }
 
     ## Unused -- These can be used as hints
-    def prepare_qa_pairs(self) -> List[Dict[str, Any]]:
+    def prepare_qa_pairs(self) -> List[Record]:
         """
         Process Q&A content to preserve question-answer relationships
 
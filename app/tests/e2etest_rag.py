@@ -251,6 +251,8 @@ class RAGEndToEndTest:
     async def index_test_content(self):
         """Index test content to Pinecone"""
         try:
+            from app.models.index_models import Record
+
             print(f"📑 Indexing {len(self.test_content)} test documents to Pinecone...")
 
             # Save test content to file
@@ -260,7 +262,7 @@ class RAGEndToEndTest:
 
             # Index the content
             start_time = time.time()
-            result = self.indexer.index_to_pinecone(self.test_content)
+            result = await self.indexer.aindex_to_pinecone([Record(**item) for item in self.test_content])
             duration = time.time() - start_time
 
             if result:
@@ -0,0 +1,255 @@
+"""
+Tests for the content processor.
+"""
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from langchain.docstore.document import Document
+
+from app.config import cache_config
+from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
+from app.services.content_processor import ContentProcessor, wait_for_index_ready
+
+
+class TestContentProcessor(unittest.TestCase):
+    """Test cases for the ContentProcessor class."""
+
+    def setUp(self):
+        """Create a processor writing to a temporary output directory."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = ChatConfig()
+        self.config.OUTPUT_DIR = self.tmp_dir.name
+        self.config.PINECONE_INDEX_NAME = "test-index"
+        self.processor = ContentProcessor(self.config)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _index(self, records, stale_ids, existing_indexes, index_to_pinecone=None, failed_batches=0):
+        """Run index_to_pinecone against a fake Pinecone client, returning (result, index)."""
+        index_to_pinecone = index_to_pinecone or self.processor.index_to_pinecone
+        with patch('app.services.content_processor.Pinecone') as mock_pinecone, \
+                patch('app.services.content_processor.OpenAIEmbeddings'), \
+                patch.object(ContentProcessor, 'aindex_documents', new_callable=AsyncMock) as mock_aindex, \
+                patch('app.services.content_processor.wait_for_index_ready'):
+            pc = mock_pinecone.return_value
+            pc.list_indexes.return_value.names.return_value = existing_indexes
+            index = pc.Index.return_value
+            # Every record was indexed before as two chunks
+            index.list.side_effect = lambda prefix: iter([[f"{prefix}0", f"{prefix}1"]])
+
+            async def aindex_documents(docs, embeddings, index):
+                # Record the upsert on the index mock, so tests can check it happens before deletes
+                index.upsert(vectors=docs)
+                return failed_batches
+
+            mock_aindex.side_effect = aindex_documents
+            result = index_to_pinecone(records, stale_ids)
+        return result, index
+
+    def test_aindex_to_pinecone_in_running_event_loop(self):
+        """Async callers can index from inside their own event loop"""
+        records = [Record(id='product:1', title='One', url='https://test-store.com/products/one',
+                          markdown='One', type='product')]
+
+        async def index_from_loop(records, stale_ids):
+            return await self.processor.aindex_to_pinecone(records, stale_ids)
+
+        result, _ = self._index(records, [], ["test-index"],
+                                lambda *args: asyncio.run(index_from_loop(*args)))
+
+        self.assertTrue(result)
+
+    def test_index_to_pinecone_deletes_only_stale_records(self):
+        """Only records named as stale are scanned for old vectors, not every record being indexed"""
+        records = [Record(id='product:1', title='One', url='https://test-store.com/products/one',
+                          markdown='One', type='product'),
+                   Record(id='product:3', title='Three', url='https://test-store.com/products/three',
+                          markdown='Three', type='product')]
+
+        result, index = self._index(records, ['product:2', 'product:1'], ["test-index"])
+
+        self.assertTrue(result)
+        self.assertEqual(sorted(call.kwargs['prefix'] for call in index.list.call_args_list),
+                         ['product:1#', 'product:2#'])
+        # The removed record loses every vector, the changed one only the chunk it no longer has
+        index.delete.assert_called_once_with(ids=['product:2#0', 'product:2#1', 'product:1#1'])
+        self.assertEqual([name for name, _, _ in index.method_calls if name in ('upsert', 'delete')],
+                         ['upsert', 'delete'])
+
+    def test_index_to_pinecone_failed_upsert_keeps_old_vectors(self):
+        """Outdated vectors are only deleted once every batch has been upserted"""
+        records = [Record(id='product:1', title='One', url='https://test-store.com/products/one',
+                          markdown='One', type='product')]
+
+        result, index = self._index(records, ['product:2', 'product:1'], ["test-index"], failed_batches=1)
+
+        self.assertFalse(result)
+        index.list.assert_not_called()
+        index.delete.assert_not_called()
+
+    def test_index_to_pinecone_new_index_skips_deletes(self):
+        """A newly created index holds no vectors, so nothing is scanned for deletion"""
+        records = [Record(id='product:1', title='One', url='https://test-store.com/products/one',
+                          markdown='One', type='product')]
+
+        result, index = self._index(records, ['product:1'], [])
+
+        self.assertTrue(result)
+        index.list.assert_not_called()
+        index.delete.assert_not_called()
+
+
+class TestTokenBatches(unittest.TestCase):
+    """Test cases for ContentProcessor.token_batches."""
+
+    def setUp(self):
+        """Create a processor with a ten-token batch and context limit."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = ChatConfig()
+        self.config.OUTPUT_DIR = self.tmp_dir.name
+        self.config.EMBEDDING_BATCH_MAX_TOKENS = 10
+        self.config.EMBEDDING_CONTEXT_LENGTH = 10
+        self.processor = ContentProcessor(self.config)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_packs_up_to_token_limit(self):
+        """Batches stay within the token budget, and an oversized chunk gets a batch and a warning of its own"""
+        docs = [Document(page_content=text, metadata={"title": "T", "chunk": i})
+                for i, text in enumerate(["aaaa", "bbbb", "cccc", "d" * 12, "e"])]
+
+        # Count one token per character
+        with patch.object(ContentProcessor, '_token_counter', return_value=len), \
+                self.assertLogs(self.processor.logger, level='WARNING') as logs:
+            batches = self.processor.token_batches(docs)
+
+        self.assertEqual([[doc.page_content for doc in batch] for batch in batches],
+                         [["aaaa", "bbbb"], ["cccc"], ["d" * 12], ["e"]])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("#3 has 12 tokens", logs.output[0])
+
+    def test_token_counter_falls_back_to_estimate(self):
+        """Without a tiktoken encoding, tokens are estimated from the text length"""
+        with patch('app.services.content_processor.tiktoken') as mock_tiktoken:
+            mock_tiktoken.encoding_for_model.side_effect = Exception("no network")
+            count_tokens = self.processor._token_counter()
+
+        self.assertEqual(count_tokens("a" * 40), 11)
+
+
+class TestAindexDocuments(unittest.TestCase):
+    """Test cases for ContentProcessor.aindex_documents."""
+
+    def setUp(self):
+        """Create a processor with fake embeddings and the embedding cache disabled."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = ChatConfig()
+        self.config.OUTPUT_DIR = self.tmp_dir.name
+        self.config.EMBEDDING_BATCH_MAX_TOKENS = 2
+        self.config.PINECONE_UPSERT_BATCH_SIZE = 2
+        self.processor = ContentProcessor(self.config)
+
+        # Count one token per document, so every batch holds two unique texts
+        self.patchers = [
+            patch.object(cache_config, 'EMBEDDING_CACHE_ENABLED', False),
+            patch.object(ContentProcessor, '_token_counter', return_value=lambda text: 1)
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+        self.embeddings = MagicMock()
+        self.embeddings.aembed_documents = AsyncMock(
+            side_effect=lambda texts: [[float(len(text))] for text in texts])
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _fake_index(fail_ids=()):
+        """Fake gRPC index whose async upserts resolve at once, failing for batches holding fail_ids."""
+        index = MagicMock()
+
+        def upsert(vectors, async_req):
+            future = Future()
+            if any(vector["id"] in fail_ids for vector in vectors):
+                future.set_exception(RuntimeError("upsert failed"))
+            else:
+                future.set_result(MagicMock(upserted_count=len(vectors)))
+            return future
+
+        index.upsert.side_effect = upsert
+        return index
+
+    def test_embeds_unique_texts_and_upserts_every_document(self):
+        """Documents sharing a text are embedded once and each upserted under its own id"""
+        docs = [Document(id="a#0", page_content="shared", metadata={"chunk": 0}),
+                Document(id="b#0", page_content="shared", metadata={"chunk": 0}),
+                Document(id="c#0", page_content="only c", metadata={"chunk": 0}),
+                Document(id="d#0", page_content="only d", metadata={"chunk": 0})]
+        index = self._fake_index()
+
+        failed = asyncio.run(self.processor.aindex_documents(docs, self.embeddings, index))
+
+        self.assertEqual(failed, 0)
+        embedded = [text for call in self.embeddings.aembed_documents.call_args_list for text in call.args[0]]
+        self.assertEqual(sorted(embedded), ["only c", "only d", "shared"])
+
+        upserted = {vector["id"]: vector
+                    for call in index.upsert.call_args_list for vector in call.kwargs["vectors"]}
+        self.assertEqual(sorted(upserted), ["a#0", "b#0", "c#0", "d#0"])
+        self.assertEqual(upserted["b#0"]["values"], [6.0])
+        self.assertEqual(upserted["b#0"]["metadata"], {"chunk": 0, "text": "shared"})
+        self.assertTrue(all(len(call.kwargs["vectors"]) <= 2 for call in index.upsert.call_args_list))
+
+    def test_counts_failed_batches(self):
+        """A failing batch is counted without stopping the other batches"""
+        docs = [Document(id=f"{name}#0", page_content=name, metadata={}) for name in "abcd"]
+        index = self._fake_index(fail_ids={"c#0"})
+
+        with self.assertLogs(self.processor.logger, level='ERROR'):
+            failed = asyncio.run(self.processor.aindex_documents(docs, self.embeddings, index))
+
+        self.assertEqual(failed, 1)
+        upserted = [vector["id"] for call in index.upsert.call_args_list for vector in call.kwargs["vectors"]]
+        self.assertIn("a#0", upserted)
+        self.assertIn("b#0", upserted)
+
+
+class TestWaitForIndexReady(unittest.TestCase):
+    """Test cases for wait_for_index_ready."""
+
+    def setUp(self):
+        self.config = ChatConfig()
+        self.config.PINECONE_INDEX_NAME = "test-index"
+        self.config.PINECONE_READY_POLL_INTERVAL = 0
+
+    def test_polls_until_ready(self):
+        """Polling stops as soon as the index reports ready"""
+        pc = MagicMock()
+        pc.describe_index.side_effect = [MagicMock(status={'ready': False}), MagicMock(status={'ready': True})]
+
+        wait_for_index_ready(pc, self.config)
+
+        self.assertEqual(pc.describe_index.call_count, 2)
+        pc.describe_index.assert_called_with("test-index")
+
+    def test_times_out(self):
+        """An index that never becomes ready raises once the timeout has passed"""
+        self.config.PINECONE_READY_TIMEOUT = 0
+        pc = MagicMock()
+        pc.describe_index.return_value = MagicMock(status={'ready': False})
+
+        with self.assertRaises(TimeoutError):
+            wait_for_index_ready(pc, self.config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Tests for the embedding cache service.
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.config import cache_config
+from app.config.chat_config import ChatConfig
+from app.services.content_processor import ContentProcessor
+from app.services.embedding_cache_service import EmbeddingCacheService
+
+
+class TestEmbeddingCacheService(unittest.TestCase):
+    """Test cases for the EmbeddingCacheService class."""
+
+    def setUp(self):
+        """Create a cache backed by a temporary database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = EmbeddingCacheService(os.path.join(self.tmp_dir.name, "embedding_cache.db"))
+
+        self.cache_patcher = patch.object(cache_config, 'EMBEDDING_CACHE_ENABLED', True)
+        self.cache_patcher.start()
+
+    def tearDown(self):
+        self.cache_patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_generate_key(self):
+        """Keys depend on both the text and the embedding model"""
+        key = EmbeddingCacheService.generate_key("text", "model-a")
+        self.assertEqual(key, EmbeddingCacheService.generate_key("text", "model-a"))
+        self.assertNotEqual(key, EmbeddingCacheService.generate_key("text", "model-b"))
+        self.assertNotEqual(key, EmbeddingCacheService.generate_key("other text", "model-a"))
+
+    def test_set_and_get_many(self):
+        """Only cached keys are returned, with vectors round-tripped through float32"""
+        self.assertTrue(self.cache.set_many({"a": [0.5, -1.0, 0.1], "b": [2.0, 0.0, 0.25]}))
+
+        found = self.cache.get_many(["a", "missing", "b", "a"])
+
+        self.assertEqual(set(found), {"a", "b"})
+        self.assertEqual(found["b"], [2.0, 0.0, 0.25])
+        self.assertEqual(found["a"][:2], [0.5, -1.0])
+        self.assertAlmostEqual(found["a"][2], 0.1, places=6)
+
+    def test_get_many_skips_expired_entries(self):
+        """Entries older than the TTL are treated as misses"""
+        self.cache.set_many({"a": [1.0]})
+
+        with patch.object(cache_config, 'EMBEDDING_CACHE_TTL', -1):
+            self.assertEqual(self.cache.get_many(["a"]), {})
+        self.assertEqual(self.cache.get_many(["a"]), {"a": [1.0]})
+
+    def test_get_many_over_query_batch_size(self):
+        """Lookups larger than one IN (...) batch return every cached key"""
+        with patch('app.services.embedding_cache_service._QUERY_BATCH_SIZE', 2):
+            self.cache.set_many({f"key{i}": [float(i)] for i in range(5)})
+            found = self.cache.get_many([f"key{i}" for i in range(5)])
+
+        self.assertEqual(found, {f"key{i}": [float(i)] for i in range(5)})
+
+    def test_disabled_cache(self):
+        """A disabled cache neither stores nor returns embeddings"""
+        with patch.object(cache_config, 'EMBEDDING_CACHE_ENABLED', False):
+            self.assertFalse(self.cache.set_many({"a": [1.0]}))
+        self.assertEqual(self.cache.get_many(["a"]), {})
+
+        self.cache.set_many({"a": [1.0]})
+        with patch.object(cache_config, 'EMBEDDING_CACHE_ENABLED', False):
+            self.assertEqual(self.cache.get_many(["a"]), {})
+
+    def test_clear(self):
+        """Clearing removes and counts every entry"""
+        self.cache.set_many({"a": [1.0], "b": [2.0]})
+
+        self.assertEqual(self.cache.clear(), 2)
+        self.assertEqual(self.cache.get_many(["a", "b"]), {})
+
+
+class TestAembedWithCache(unittest.TestCase):
+    """Test cases for ContentProcessor.aembed_with_cache."""
+
+    def setUp(self):
+        """Create a processor whose embedding cache uses a temporary database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = ChatConfig()
+        self.config.OUTPUT_DIR = self.tmp_dir.name
+        self.config.OPENAI_EMBEDDING_MODEL = "test-model"
+        self.processor = ContentProcessor(self.config)
+        self.cache = EmbeddingCacheService(os.path.join(self.tmp_dir.name, "embedding_cache.db"))
+
+        self.cache_patchers = [
+            patch.object(cache_config, 'EMBEDDING_CACHE_ENABLED', True),
+            patch('app.services.content_processor.embedding_cache', self.cache)
+        ]
+        for patcher in self.cache_patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.cache_patchers:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_only_misses_are_embedded(self):
+        """Cached texts are served from the cache and misses are embedded and stored, in order"""
+        self.cache.set_many({EmbeddingCacheService.generate_key("cached", "test-model"): [1.0, 1.0]})
+        embeddings = MagicMock()
+        embeddings.aembed_documents = AsyncMock(return_value=[[2.0, 2.0], [3.0, 3.0]])
+
+        vectors = asyncio.run(self.processor.aembed_with_cache(embeddings, ["new one", "cached", "new two"]))
+
+        embeddings.aembed_documents.assert_awaited_once_with(["new one", "new two"])
+        self.assertEqual(vectors, [[2.0, 2.0], [1.0, 1.0], [3.0, 3.0]])
+
+        # A second run is served entirely from the cache
+        embeddings.aembed_documents.reset_mock()
+        vectors = asyncio.run(self.processor.aembed_with_cache(embeddings, ["new two", "new one"]))
+        embeddings.aembed_documents.assert_not_awaited()
+        self.assertEqual(vectors, [[3.0, 3.0], [2.0, 2.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
 
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
 from app.services.shopify_indexer import ShopifyIndexer
 from app.services.chat_service import ChatService
 from app.models.chat_models import Message
@@ -100,8 +101,8 @@ Choosing the right attribution model depends on your business goals, sales cycle
         ]
 
     @patch('app.agents.chat_agents.agent_manager')
-    @patch('app.services.shopify_indexer.PineconeVectorStore')
-    async def test_rag_pipeline(self, mock_pinecone_vectorstore, mock_agent_manager):
+    @patch('app.services.shopify_indexer.ContentProcessor')
+    async def test_rag_pipeline(self, mock_content_processor, mock_agent_manager):
         """Test the complete RAG pipeline from indexing to retrieval"""
         # STEP 1: Configure mocks for RAG agent
         mock_rag_response = {
@@ -138,34 +139,19 @@ Choosing the right attribution model depends on your business goals, sales cycle
         mock_agent_manager.database_agent = mock_db_agent
 
         # STEP 2: Index test data to Pinecone
-        # Configure PineconeVectorStore mock
-        mock_vector_store = MagicMock()
-        mock_pinecone_vectorstore.from_documents.return_value = mock_vector_store
+        # Indexing itself is delegated to ContentProcessor, which has its own tests
+        processor = mock_content_processor.return_value
+        processor.aindex_to_pinecone = AsyncMock(return_value=True)
 
         # Create and run the indexer
         indexer = ShopifyIndexer(config=self.config)
+        records = [Record(**record) for record in self.test_records]
+        result = await indexer.aindex_to_pinecone(records)
 
-        # Mock the Pinecone class
-        with patch('pinecone.Pinecone') as mock_pinecone:
-            # Configure mock Pinecone instance
-            mock_pinecone_instance = mock_pinecone.return_value
-            mock_list_indexes = MagicMock()
-            mock_list_indexes.names.return_value = []  # Empty list means index doesn't exist
-            mock_pinecone_instance.list_indexes.return_value = mock_list_indexes
-
-            # Mock ServerlessSpec
-            with patch('pinecone.ServerlessSpec') as mock_serverless_spec:
-                # Index the test records
-                result = indexer.index_to_pinecone(self.test_records)
-
-                # Verify indexing was successful
-                self.assertTrue(result, "Indexing to Pinecone failed")
-
-                # Verify that create_index was called
-                mock_pinecone_instance.create_index_from_shopify_store.assert_called_once()
-
-                # Verify that from_documents was called
-                mock_pinecone_vectorstore.from_documents.assert_called_once()
+        # Verify indexing was successful
+        self.assertTrue(result, "Indexing to Pinecone failed")
+        processor.aindex_to_pinecone.assert_awaited_once()
+        self.assertEqual(processor.aindex_to_pinecone.call_args.args[0], records)
 
         # STEP 3: Test chat service with a relevant query
         # Create a test query related to the indexed content
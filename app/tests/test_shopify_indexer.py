@@ -1,9 +1,15 @@
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import json
-import requests
 import os
+import tempfile
+import orjson
+import zstandard
+from app.config import cache_config
 from app.config.chat_config import ChatConfig
+from app.models.index_models import Record
+from app.services.shopify_cache_service import ShopifyCacheService
 from app.services.shopify_indexer import ShopifyIndexer  # Updated import path
 
 
@@ -16,18 +22,29 @@ class TestShopifyIndexer(unittest.TestCase):
         self.config.PRODUCT_FETCH_LIMIT = 30
         self.config.OUTPUT_DIR = "test_output"
         self.config.SAVE_INTERMEDIATE_FILES = False
+        self.config.PINECONE_INDEX_NAME = "test-index"
+        self.config.INDEX_MANIFEST_FILE = os.path.join(self.config.OUTPUT_DIR, "manifest.json")
+        self.config.SHOPIFY_CONTENT_FILE = os.path.join(self.config.OUTPUT_DIR, "content.json.zst")
 
         # Create test output directory
         os.makedirs(self.config.OUTPUT_DIR, exist_ok=True)
 
+        # Disable the Shopify response cache so every test hits the mocked API
+        self.cache_patcher = patch.object(cache_config, 'SHOPIFY_CACHE_ENABLED', False)
+        self.cache_patcher.start()
+
         # Initialize the indexer with the test config
         self.indexer = ShopifyIndexer(config=self.config)
 
     def tearDown(self):
         # Clean up test directory if needed
-        pass
+        self.cache_patcher.stop()
+        if os.path.exists(self.config.INDEX_MANIFEST_FILE):
+            os.remove(self.config.INDEX_MANIFEST_FILE)
+        if os.path.exists(self.config.SHOPIFY_CONTENT_FILE):
+            os.remove(self.config.SHOPIFY_CONTENT_FILE)
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_blogs_success(self, mock_get):
         # Set up the mock response
         mock_response = MagicMock()
@@ -49,13 +66,10 @@ class TestShopifyIndexer(unittest.TestCase):
 
         # Verify the request was made correctly
         mock_get.assert_called_once_with(
-            url="https://919904.myshopify.com/admin/api/2024-04/blogs.json",
+            "/blogs.json",
             params={
                 'fields': 'id,updated_at,handle,title',
                 'limit': 10
-            },
-            headers={
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
             }
         )
 
@@ -64,7 +78,7 @@ class TestShopifyIndexer(unittest.TestCase):
         self.assertEqual(blogs[0]['id'], 123456)
         self.assertEqual(blogs[0]['title'], "Test Blog")
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_blogs_failure(self, mock_get):
         # Set up the mock response for a failure
         mock_response = MagicMock()
@@ -77,7 +91,7 @@ class TestShopifyIndexer(unittest.TestCase):
         # Verify an empty list is returned on failure
         self.assertEqual(blogs, [])
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_articles_success(self, mock_get):
         # Set up the mock response
         mock_response = MagicMock()
@@ -102,15 +116,12 @@ class TestShopifyIndexer(unittest.TestCase):
 
         # Verify the request was made correctly
         mock_get.assert_called_once_with(
-            url="https://919904.myshopify.com/admin/api/2024-04/blogs/123456/articles.json",
+            "/blogs/123456/articles.json",
             params={
                 'status': 'active',
                 'published_status': 'published',
                 'fields': 'id,blog_id,updated_at,title,body_html,handle,author',
                 'limit': 20
-            },
-            headers={
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
             }
         )
 
@@ -119,7 +130,7 @@ class TestShopifyIndexer(unittest.TestCase):
         self.assertEqual(articles[0]['id'], 789012)
         self.assertEqual(articles[0]['title'], "Test Article")
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_articles_failure(self, mock_get):
         # Set up the mock response for a failure
         mock_response = MagicMock()
@@ -132,7 +143,7 @@ class TestShopifyIndexer(unittest.TestCase):
         # Verify an empty list is returned on failure
         self.assertEqual(articles, [])
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_products_success(self, mock_get):
         # Set up the mock response
         mock_response = MagicMock()
@@ -155,16 +166,13 @@ class TestShopifyIndexer(unittest.TestCase):
 
         # Verify the request was made correctly
         mock_get.assert_called_once_with(
-            url="https://919904.myshopify.com/admin/api/2024-04/products.json",
+            "/products.json",
             params={
                 'status': 'active',
                 'published_status': 'published',
                 'fields': 'id,updated_at,title,body_html,handle',
                 'presentment_currencies': 'USD',
                 'limit': 30
-            },
-            headers={
-                'X-Shopify-Access-Token': self.config.SHOPIFY_API_KEY
             }
         )
 
@@ -173,7 +181,7 @@ class TestShopifyIndexer(unittest.TestCase):
         self.assertEqual(products[0]['id'], 345678)
         self.assertEqual(products[0]['title'], "Test Product")
 
-    @patch('requests.get')
+    @patch('httpx.Client.get')
     def test_get_products_failure(self, mock_get):
         # Set up the mock response for a failure
         mock_response = MagicMock()
@@ -186,25 +194,140 @@ class TestShopifyIndexer(unittest.TestCase):
         # Verify an empty list is returned on failure
         self.assertEqual(products, [])
 
-    # Update the patch path to use the full module path
-    @patch('app.services.shopify_indexer.md')
-    def test_html_to_markdown(self, mock_md):
-        # Set up the mock response
-        mock_md.return_value = "# Test Heading\nThis is a test paragraph"
-
+    @patch('httpx.Client.get')
+    def test_get_blogs_falls_back_to_stale_cache(self, mock_get):
+        """A failed request should return the last cached blogs even if expired"""
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch.object(cache_config, 'SHOPIFY_CACHE_ENABLED', True), \
+                patch.object(cache_config, 'SHOPIFY_CACHE_TTL_NORMAL', 0), \
+                patch('app.services.shopify_indexer.shopify_cache',
+                      ShopifyCacheService(os.path.join(tmp_dir, "shopify_cache.db"))):
+            # First call succeeds and populates the cache
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.content = json.dumps({"blogs": [{"id": 123456, "title": "Test Blog"}]})
+            mock_get.return_value = mock_response
+            self.assertEqual(len(self.indexer.get_blogs()), 1)
+
+            # Second call fails, the expired entry is served instead
+            mock_get.return_value = MagicMock(status_code=503)
+            blogs = self.indexer.get_blogs()
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(blogs, [{"id": 123456, "title": "Test Blog"}])
+
+    @patch('httpx.Client.get')
+    def test_get_articles_served_from_cache(self, mock_get):
+        """Fresh cached articles are shared by the sync and async getters without a request"""
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch.object(cache_config, 'SHOPIFY_CACHE_ENABLED', True), \
+                patch('app.services.shopify_indexer.shopify_cache',
+                      ShopifyCacheService(os.path.join(tmp_dir, "shopify_cache.db"))):
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.content = json.dumps({"articles": [{"id": 789012, "title": "Test Article"}]})
+            mock_get.return_value = mock_response
+            self.assertEqual(len(self.indexer.get_articles(blog_id=123456)), 1)
+
+            client = MagicMock()
+            client.get = AsyncMock()
+            articles = asyncio.run(self.indexer._aget_articles(client, 123456))
+
+        mock_get.assert_called_once()
+        client.get.assert_not_called()
+        self.assertEqual(articles, [{"id": 789012, "title": "Test Article"}])
+
+    def test_html_to_markdown(self):
         # Test with summarize_content = False
         self.config.SUMMARIZE_CONTENT = False
         result = self.indexer.html_to_markdown("<h1>Test Heading</h1><p>This is a test paragraph</p>")
 
         # Verify the result
-        self.assertEqual(result, "# Test Heading\nThis is a test paragraph")
-        mock_md.assert_called_once()
+        self.assertEqual(result, "# Test Heading\n\nThis is a test paragraph")
+
+    def test_html_to_markdown_formatting(self):
+        html = ('<p>Read <strong>this</strong> <a href="https://test-store.myshopify.com">guide</a></p>'
+                '<ul><li>First</li><li>Second</li></ul>'
+                '<table><tr><th>Plan</th><th>Price</th></tr><tr><td>Pro</td><td>$10</td></tr></table>'
+                '<script>ignored()</script>')
+
+        result = self.indexer.html_to_markdown(html)
+
+        self.assertEqual(result, "Read **this** [guide](https://test-store.myshopify.com)\n\n"
+                                 "- First\n- Second\n\n"
+                                 "| Plan | Price |\n|---|---|\n| Pro | $10 |")
+
+    def test_html_to_markdown_inline_spacing(self):
+        """Whitespace at the edges of inline tags stays outside the markdown markers"""
+        cases = {
+            '<p><strong>Size: </strong>Large</p>': "**Size:** Large",
+            '<p>Made with<em> organic </em>cotton</p>': "Made with *organic* cotton",
+            '<p>See<a href="/x"> our guide</a>for details</p>': "See [our guide](/x)for details",
+            '<p>Made with <em> organic</em> cotton</p>': "Made with *organic* cotton",
+            '<p>One<b> </b>two</p>': "One two",
+        }
+        for html, expected in cases.items():
+            with self.subTest(html=html):
+                self.assertEqual(self.indexer.html_to_markdown(html), expected)
+
+    def test_html_to_markdown_too_deeply_nested(self):
+        """HTML past the parser's nesting limit falls back to the original content rather than being cut short"""
+        html = '<p>before</p>' + '<div>' * 300 + 'deep' + '</div>' * 300 + '<p>after</p>'
+
+        self.assertEqual(self.indexer.html_to_markdown(html), html)
+        with self.assertLogs(self.indexer.logger, level='ERROR') as logs:
+            self.assertEqual(self.indexer.convert_html_many([html]), [(html, None)])
+        self.assertIn("Error converting HTML to markdown", logs.output[0])
+
+    def test_convert_html_many_parallel(self):
+        """Worker-process conversion matches serial conversion and keeps record order"""
+        html_contents = ["<h1>One</h1>", "<p>Two <b>bold</b></p>", "<ul><li>Three</li></ul>"]
+        expected = [(self.indexer.html_to_markdown(html), [self.indexer.html_to_markdown(html)])
+                    for html in html_contents]
+
+        self.config.PARALLEL_CONVERSION_MIN_RECORDS = 1
+        self.config.CONVERSION_MAX_WORKERS = 2
+        self.assertEqual(self.indexer.convert_html_many(html_contents), expected)
+
+    def test_convert_html_chunks(self):
+        """Chunks break between paragraphs, respect the size limit and overlap"""
+        self.config.CHUNK_SIZE = 40
+        self.config.CHUNK_OVERLAP = 20
+        html = "<p>First paragraph here.</p><p>Second paragraph.</p><p>Third one.</p>"
+
+        [(markdown, chunks)] = self.indexer.convert_html_many([html])
+
+        self.assertEqual(markdown, self.indexer.html_to_markdown(html))
+        self.assertEqual(chunks, [
+            "First paragraph here.\n\nSecond paragraph.",
+            "Second paragraph.\n\nThird one."
+        ])
+
+    def test_convert_html_chunks_oversized_paragraph(self):
+        """A paragraph longer than a chunk is split at word boundaries and its chunks still overlap"""
+        self.config.CHUNK_SIZE = 800
+        self.config.CHUNK_OVERLAP = 200
+        words = [f"word{i:03d}" for i in range(250)]
+        html = f"<p>{' '.join(words)}</p>"
+
+        [(_, chunks)] = self.indexer.convert_html_many([html])
+
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(len(chunk) <= 800 for chunk in chunks))
+        self.assertEqual(chunks[0].split()[0], "word000")
+        self.assertEqual(chunks[-1].split()[-1], "word249")
+        for previous, chunk in zip(chunks, chunks[1:]):
+            previous_words, chunk_words = previous.split(), chunk.split()
+            carried = len(previous_words) - previous_words.index(chunk_words[0])
+            self.assertEqual(previous_words[-carried:], chunk_words[:carried])
+            self.assertTrue(0 < len(" ".join(chunk_words[:carried])) <= 200)
+            self.assertGreater(len(" ".join(chunk_words[:carried])), 150)
 
     # Update the patch paths to use the full module paths
     @patch('app.services.shopify_indexer.ShopifyIndexer.get_blogs')
-    @patch('app.services.shopify_indexer.ShopifyIndexer.get_articles')
-    @patch('app.services.shopify_indexer.ShopifyIndexer.html_to_markdown')
-    def test_prepare_blog_articles(self, mock_html_to_md, mock_get_articles, mock_get_blogs):
+    @patch('app.services.shopify_indexer.ShopifyIndexer._aget_articles', new_callable=AsyncMock)
+    @patch('app.utils.markdown_converter.convert_html')
+    def test_prepare_blog_articles(self, mock_convert_html, mock_get_articles, mock_get_blogs):
         # Set up mock responses
         mock_get_blogs.return_value = [
             {
@@ -223,7 +346,7 @@ class TestShopifyIndexer(unittest.TestCase):
             }
         ]
 
-        mock_html_to_md.return_value = "# Test Article\n\nArticle content"
+        mock_convert_html.return_value = ("# Test Article\n\nArticle content", ["# Test Article\n\nArticle content"], None)
 
         # Set shopify site base URL
         self.config.SHOPIFY_SITE_BASE_URL = "https://test-store.myshopify.com"
@@ -233,18 +356,19 @@ class TestShopifyIndexer(unittest.TestCase):
 
         # Verify the results
         self.assertEqual(len(blogs), 1)
-        self.assertEqual(blogs[0]['title'], 'Test Blog')
-        self.assertEqual(blogs[0]['url'], 'https://test-store.myshopify.com/blogs/test-blog')
+        self.assertEqual(blogs[0].title, 'Test Blog')
+        self.assertEqual(blogs[0].url, 'https://test-store.myshopify.com/blogs/test-blog')
 
         self.assertEqual(len(records), 1)
-        self.assertEqual(records[0]['title'], 'Test Article')
-        self.assertEqual(records[0]['url'], 'https://test-store.myshopify.com/blogs/test-blog/test-article')
-        self.assertEqual(records[0]['markdown'], '# Test Article\n\nArticle content')
+        self.assertEqual(records[0].title, 'Test Article')
+        self.assertEqual(records[0].url, 'https://test-store.myshopify.com/blogs/test-blog/test-article')
+        self.assertEqual(records[0].markdown, '# Test Article\n\nArticle content')
+        self.assertEqual(records[0].chunks, ['# Test Article\n\nArticle content'])
 
     # Update the patch paths to use the full module paths
     @patch('app.services.shopify_indexer.ShopifyIndexer.get_products')
-    @patch('app.services.shopify_indexer.ShopifyIndexer.html_to_markdown')
-    def test_prepare_products(self, mock_html_to_md, mock_get_products):
+    @patch('app.utils.markdown_converter.convert_html')
+    def test_prepare_products(self, mock_convert_html, mock_get_products):
         # Set up mock responses
         mock_get_products.return_value = [
             {
@@ -255,151 +379,174 @@ class TestShopifyIndexer(unittest.TestCase):
             }
         ]
 
-        mock_html_to_md.return_value = "# Test Product\n\nProduct description"
+        mock_convert_html.return_value = ("# Test Product\n\nProduct description", ["# Test Product\n\nProduct description"], None)
 
         # Set shopify site base URL
         self.config.SHOPIFY_SITE_BASE_URL = "https://test-store.myshopify.com"
 
         # Call the method
-        products, records = self.indexer.prepare_products()
+        products, variants = self.indexer.prepare_products()
 
         # Verify the results
         self.assertEqual(len(products), 1)
-        self.assertEqual(products[0]['title'], 'Test Product')
-        self.assertEqual(products[0]['url'], 'https://test-store.myshopify.com/products/test-product')
+        self.assertEqual(products[0].id, 'product:789')
+        self.assertEqual(products[0].title, 'Test Product')
+        self.assertEqual(products[0].url, 'https://test-store.myshopify.com/products/test-product')
+        self.assertEqual(products[0].markdown, '# Test Product\n\nProduct description')
+        self.assertEqual(products[0].chunks, ['# Test Product\n\nProduct description'])
 
-        self.assertEqual(len(records), 1)
-        self.assertEqual(records[0]['title'], 'Test Product')
-        self.assertEqual(records[0]['url'], 'https://test-store.myshopify.com/products/test-product')
-        self.assertEqual(records[0]['markdown'], '# Test Product\n\nProduct description')
-
-    # Here are the three test methods that were defined outside the class before
-    @patch('app.services.shopify_indexer.Pinecone')
-    @patch('app.services.shopify_indexer.PineconeVectorStore')
-    @patch('app.services.shopify_indexer.OpenAIEmbeddings')
-    def test_index_to_pinecone_new_index(self, mock_embeddings, mock_pinecone_vectorstore, mock_pinecone):
-        """Test creating a new Pinecone index and indexing documents"""
-        # Set up necessary configs
-        self.config.PINECONE_INDEX_NAME = "test-index"
-        self.config.PINECONE_DIMENSION = 1536
-        self.config.PINECONE_CLOUD = "aws"
-        self.config.PINECONE_REGION = "us-west-2"
-        self.config.PINECONE_API_KEY = "test-pinecone-api-key"
-        self.config.OPENAI_API_KEY = "test-openai-api-key"
-        self.config.OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
-        self.config.CHUNK_SIZE = 1000
-        self.config.CHUNK_OVERLAP = 200
+        # Variants are not indexed as records of their own
+        self.assertEqual(variants, [])
 
-        # Set up mock Pinecone instance and index
-        mock_pinecone_instance = mock_pinecone.return_value
-        mock_list_indexes = MagicMock()
-        mock_list_indexes.names.return_value = []  # Empty list means index doesn't exist
-        mock_pinecone_instance.list_indexes.return_value = mock_list_indexes
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_blogs', return_value=[])
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_products')
+    @patch('app.utils.markdown_converter.convert_html')
+    def test_prepare_products_incremental(self, mock_convert_html, mock_get_products, _mock_get_blogs):
+        """Unchanged products are skipped and removed products are reported for deletion"""
+        mock_convert_html.return_value = ("Product description", ["Product description"], None)
+        mock_get_products.return_value = [
+            {'id': 1, 'handle': 'kept', 'title': 'Kept', 'updated_at': '2023-01-01T00:00:00Z'},
+            {'id': 2, 'handle': 'removed', 'title': 'Removed', 'updated_at': '2023-01-01T00:00:00Z'}
+        ]
+        records = self.indexer.get_all_content()
+        self.assertEqual([r.id for r in self.indexer.get_changed_records(records)], ['product:1', 'product:2'])
+        self.indexer.save_manifest()
 
-        # Set up mock for vector store
-        mock_vectorstore = mock_pinecone_vectorstore.from_documents.return_value
+        # Next run: product 1 is unchanged, product 2 is gone and product 3 is new
+        mock_get_products.return_value = [
+            {'id': 1, 'handle': 'kept', 'title': 'Kept', 'updated_at': '2023-01-01T00:00:00Z'},
+            {'id': 3, 'handle': 'new', 'title': 'New', 'updated_at': '2023-02-01T00:00:00Z'}
+        ]
+        indexer = ShopifyIndexer(config=self.config)
+        records = indexer.get_all_content()
+        changed = indexer.get_changed_records(records)
+
+        # The full catalog is still returned, only indexing is limited to the changes
+        self.assertEqual([r.id for r in records], ['product:1', 'product:3'])
+        self.assertEqual([r.id for r in changed], ['product:3'])
+        self.assertEqual(indexer.get_indexed_ids(changed), [])
+        self.assertEqual(indexer.get_deleted_ids(), ['product:2'])
+
+        # A manifest only applies to the index it was saved for
+        self.config.PINECONE_INDEX_NAME = "other-index"
+        indexer = ShopifyIndexer(config=self.config)
+        records = indexer.get_all_content()
+        self.assertEqual(indexer.get_changed_records(records), records)
+        self.assertEqual(indexer.get_deleted_ids(), [])
+
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_products', return_value=[])
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_blogs')
+    @patch('app.services.shopify_indexer.ShopifyIndexer._aget_articles', new_callable=AsyncMock)
+    @patch('app.utils.markdown_converter.convert_html')
+    def test_failed_article_fetch_keeps_indexed_articles(self, mock_convert_html, mock_get_articles,
+                                                         mock_get_blogs, _mock_get_products):
+        """Articles of a blog whose request failed are neither deleted nor forgotten"""
+        mock_convert_html.return_value = ("Article content", ["Article content"], None)
+        articles_by_blog = {
+            1: [{'id': 10, 'handle': 'a', 'title': 'A', 'updated_at': '2023-01-01T00:00:00Z'}],
+            2: [{'id': 20, 'handle': 'b', 'title': 'B', 'updated_at': '2023-01-01T00:00:00Z'}],
+            3: [{'id': 30, 'handle': 'c', 'title': 'C', 'updated_at': '2023-01-01T00:00:00Z'}]
+        }
+        mock_get_articles.side_effect = lambda client, blog_id: articles_by_blog[blog_id]
+        mock_get_blogs.return_value = [{'id': blog_id, 'handle': f'blog-{blog_id}', 'title': f'Blog {blog_id}'}
+                                       for blog_id in (1, 2, 3)]
+        self.indexer.get_all_content()
+        self.indexer.save_manifest()
+
+        # Next run: the articles request of blog 1 fails and blog 3 is gone
+        articles_by_blog[1] = None
+        mock_get_blogs.return_value = mock_get_blogs.return_value[:2]
+        indexer = ShopifyIndexer(config=self.config)
+        records = indexer.get_all_content()
+
+        self.assertEqual([r.id for r in records if r.type == 'article'], ['article:20'])
+        self.assertEqual(sorted(indexer.get_deleted_ids()), ['article:30', 'blog:3'])
+
+        # Article 10 stays in the manifest, so it is not re-indexed once blog 1 responds again
+        indexer.save_manifest()
+        articles_by_blog[1] = [{'id': 10, 'handle': 'a', 'title': 'A', 'updated_at': '2023-01-01T00:00:00Z'}]
+        indexer = ShopifyIndexer(config=self.config)
+        records = indexer.get_all_content()
+        self.assertEqual([r.id for r in indexer.get_changed_records(records) if r.type == 'article'], [])
+        self.assertEqual(indexer.get_deleted_ids(), [])
+
+    def test_save_content_bundle(self):
+        """Fetched content is saved as a single zstd-compressed JSON bundle"""
+        records = [
+            Record(title='Blog', url='https://test-store.com/blogs/news', markdown='Blog', type='blog'),
+            Record(title='Article', url='https://test-store.com/blogs/news/a', markdown='Article', type='article'),
+            Record(title='Product', url='https://test-store.com/products/p', markdown='Product', type='product',
+                   id='product:1', chunks=['Product'], updated_at='2024-01-01T00:00:00Z')
+        ]
+        self.indexer.save_content_bundle(records)
+
+        with open(self.config.SHOPIFY_CONTENT_FILE, "rb") as f:
+            bundle = orjson.loads(zstandard.decompress(f.read()))
+        self.assertEqual(sorted(bundle), ['articles', 'blogs', 'products'])
+        self.assertEqual(bundle['products'][0]['title'], 'Product')
+        self.assertEqual(bundle['articles'][0]['url'], 'https://test-store.com/blogs/news/a')
+        self.assertEqual(bundle['products'][0], {
+            'id': 'product:1', 'title': 'Product', 'url': 'https://test-store.com/products/p',
+            'markdown': 'Product', 'type': 'product', 'updated_at': '2024-01-01T00:00:00Z'
+        })
 
-        # Test data for indexing
-        test_records = [
-            {
-                "title": "Test Article",
-                "url": "https://test-store.myshopify.com/blogs/test-blog/test-article",
-                "markdown": "# Test Article\n\nThis is a test article content"
-            },
-            {
-                "title": "Test Product",
-                "url": "https://test-store.myshopify.com/products/test-product",
-                "markdown": "# Test Product\n\nThis is a test product description"
-            }
+    # Here are the three test methods that were defined outside the class before
+    @patch('app.services.shopify_indexer.ContentProcessor')
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_blogs', return_value=[])
+    @patch('app.services.shopify_indexer.ShopifyIndexer.get_products')
+    @patch('app.utils.markdown_converter.convert_html')
+    def test_index_to_pinecone_passes_stale_ids(self, mock_convert_html, mock_get_products, _mock_get_blogs,
+                                                mock_content_processor):
+        """Indexing is delegated to ContentProcessor with the removed and previously indexed record ids"""
+        mock_convert_html.return_value = ("Product description", ["Product description"], None)
+        mock_get_products.return_value = [
+            {'id': 1, 'handle': 'changed', 'title': 'Changed', 'updated_at': '2023-01-01T00:00:00Z'},
+            {'id': 2, 'handle': 'removed', 'title': 'Removed', 'updated_at': '2023-01-01T00:00:00Z'}
         ]
+        self.indexer.get_all_content()
+        self.indexer.save_manifest()
 
-        # Add mock for ServerlessSpec
-        mock_serverless_spec = MagicMock()
-        mock_serverless_spec.return_value = MagicMock()
-        with patch('pinecone.ServerlessSpec', mock_serverless_spec):
-            # Call the method
-            result = self.indexer.index_to_pinecone(test_records)
-
-        # Verify that Pinecone was initialized with the correct API key
-        mock_pinecone.assert_called_once_with(api_key="test-pinecone-api-key")
-
-        # Verify that we checked for existing indexes
-        mock_pinecone_instance.list_indexes.assert_called_once()
-
-        # Verify that a new index was created with correct parameters
-        mock_pinecone_instance.create_index_from_shopify_store.assert_called_once()
-        create_index_call = mock_pinecone_instance.create_index_from_shopify_store.call_args
-        create_index_call = mock_pinecone_instance.create_index_from_shopify_store.call_args
-        self.assertEqual(create_index_call[1]["name"], "test-index")
-        self.assertEqual(create_index_call[1]["dimension"], 1536)
-        self.assertEqual(create_index_call[1]["metric"], "cosine")
-        # Check ServerlessSpec was passed correctly
-        self.assertEqual(create_index_call[1]["spec"].cloud, "aws")
-        self.assertEqual(create_index_call[1]["spec"].region, "us-west-2")
-
-        # Verify that OpenAI embeddings were initialized with correct parameters
-        mock_embeddings.assert_called_once_with(
-            api_key="test-openai-api-key",
-            model="text-embedding-ada-002",
-            dimensions=1536
-        )
+        # Next run: product 1 changed, product 2 is gone and product 3 is new
+        mock_get_products.return_value = [
+            {'id': 1, 'handle': 'changed', 'title': 'Changed', 'updated_at': '2023-02-01T00:00:00Z'},
+            {'id': 3, 'handle': 'new', 'title': 'New', 'updated_at': '2023-02-01T00:00:00Z'}
+        ]
+        indexer = ShopifyIndexer(config=self.config)
+        changed = indexer.get_changed_records(indexer.get_all_content())
+        processor = mock_content_processor.return_value
+        processor.aindex_to_pinecone = AsyncMock(return_value=True)
 
-        # Verify that documents were indexed
-        mock_pinecone_vectorstore.from_documents.assert_called_once()
-        from_docs_call = mock_pinecone_vectorstore.from_documents.call_args
-        # Check the index name and API key in the from_documents call
-        self.assertEqual(from_docs_call[1]["index_name"], "test-index")
-        self.assertEqual(from_docs_call[1]["pinecone_api_key"], "test-pinecone-api-key")
+        result = indexer.index_to_pinecone(changed)
 
-        # Verify the result
         self.assertTrue(result)
+        mock_content_processor.assert_called_once_with(self.config)
+        processor.aindex_to_pinecone.assert_awaited_once_with(changed, ['product:2', 'product:1'])
 
-    @patch('app.services.shopify_indexer.Pinecone')
-    @patch('app.services.shopify_indexer.PineconeVectorStore')
-    def test_index_to_pinecone_empty_records(self, mock_pinecone_vectorstore, mock_pinecone):
+    @patch('app.services.shopify_indexer.ContentProcessor')
+    def test_index_to_pinecone_empty_records(self, mock_content_processor):
         """Test handling of empty records list"""
-        # Empty test data
-        test_records = []
+        processor = mock_content_processor.return_value
+        processor.aindex_to_pinecone = AsyncMock(return_value=True)
 
-        # Call the method
-        result = self.indexer.index_to_pinecone(test_records)
+        # Nothing was fetched or indexed before, so there is nothing to delete either
+        result = self.indexer.index_to_pinecone([])
 
-        # Verify the result - implementation dependent
-        # Some implementations might return True for empty lists (nothing to do = success)
-        # Others might return False (nothing to index = failure)
-        # Adjust as needed based on your implementation
-        self.assertTrue(result)  # Adjust based on expected behavior
+        processor.aindex_to_pinecone.assert_awaited_once_with([], [])
+        self.assertTrue(result)
 
-    @patch('app.services.shopify_indexer.Pinecone')
-    @patch('app.services.shopify_indexer.PineconeVectorStore')
-    @patch('app.services.shopify_indexer.OpenAIEmbeddings')
-    def test_index_to_pinecone_exception_handling(self, mock_embeddings, mock_pinecone_vectorstore, mock_pinecone):
+    @patch('app.services.content_processor.Pinecone')
+    def test_index_to_pinecone_exception_handling(self, mock_pinecone):
         """Test exception handling during indexing"""
-        # Set up necessary configs
-        self.config.PINECONE_API_KEY = "test-pinecone-api-key"
-        self.config.PINECONE_INDEX_NAME = "test-index"
-        self.config.PINECONE_DIMENSION = 1536
-        self.config.OPENAI_API_KEY = "test-openai-api-key"
-        self.config.OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
-        self.config.CHUNK_SIZE = 1000
-        self.config.CHUNK_OVERLAP = 200
-
-        # Set up mock Pinecone instance and index
-        mock_pinecone_instance = mock_pinecone.return_value
-        mock_list_indexes = MagicMock()
-        mock_list_indexes.names.return_value = ["test-index"]  # Index exists
-        mock_pinecone_instance.list_indexes.return_value = mock_list_indexes
-
         # Set up mock to raise an exception
-        mock_pinecone_vectorstore.from_documents.side_effect = Exception("Test exception")
+        mock_pinecone.side_effect = Exception("Test exception")
 
         # Test data for indexing
         test_records = [
-            {
-                "title": "Test Article",
-                "url": "https://test-store.myshopify.com/blogs/test-blog/test-article",
-                "markdown": "# Test Article\n\nThis is a test article content"
-            }
+            Record(
+                title="Test Article",
+                url="https://test-store.myshopify.com/blogs/test-blog/test-article",
+                markdown="# Test Article\n\nThis is a test article content"
+            )
         ]
 
         # Call the method
@@ -445,7 +592,7 @@ if __name__ == '__main__':
     suite = unittest.TestSuite()
 
     # Add the specific tests you want to run
-    suite.addTest(TestShopifyIndexer('test_index_to_pinecone_new_index'))
+    suite.addTest(TestShopifyIndexer('test_index_to_pinecone_passes_stale_ids'))
     suite.addTest(TestShopifyIndexer('test_index_to_pinecone_empty_records'))
     suite.addTest(TestShopifyIndexer('test_index_to_pinecone_exception_handling'))
 
@@ -1,7 +1,8 @@
 """
 Tools for the agent system.
 """
-from datetime import datetime
+from datetime import date, datetime, timezone
+from functools import lru_cache
 from langchain_core.tools import tool
 from langchain.agents.agent_toolkits import create_retriever_tool
 from langchain_core.prompts import PromptTemplate
@@ -9,6 +10,40 @@ from langchain_pinecone import PineconeVectorStore
 from langchain_openai import OpenAIEmbeddings
 from app.config.chat_config import ChatConfig
 
+# Sample query_database responses, keyed by the keywords that select them (checked in order)
+_DATABASE_RESPONSES = {
+    ("products", "revenue"): """
+            | Product          | Revenue   | Units Sold |
+            |------------------|-----------|------------|
+            | Attribution Pro  | $125,000  | 250        |
+            | Marketing Suite  | $87,500   | 350        |
+            | Analytics Basic  | $45,000   | 900        |
+            | Data Connector   | $32,500   | 650        |
+            """,
+    ("customer", "conversion"): """
+            | Month     | Visitors | Conversions | Rate  |
+            |-----------|----------|-------------|-------|
+            | January   | 25,400   | 762         | 3.0%  |
+            | February  | 28,500   | 913         | 3.2%  |
+            | March     | 32,100   | 1,091       | 3.4%  |
+            | April     | 30,800   | 956         | 3.1%  |
+            """,
+    ("average", "order"): """
+            | Category        | Avg Order Value |
+            |-----------------|-----------------|
+            | Enterprise      | $3,250          |
+            | Mid-market      | $1,125          |
+            | Small Business  | $485            |
+            """,
+}
+
+
+@lru_cache(maxsize=1)
+def _current_time_str(day_ordinal: int) -> str:
+    """Format the current time message; only changes once per day, so it is cached by day."""
+    return f'the current time is {date.fromordinal(day_ordinal).strftime("%d-%B-%Y")}'
+
+
 class ToolManager:
     """Manager for all tools used by the agent."""
     config = ChatConfig()
@@ -17,9 +52,7 @@ class ToolManager:
     @tool
     def get_current_time() -> str:
         """Get the current time of the user"""
-        now = datetime.utcnow()
-        current_time = f'the current time is {now.strftime("%d-%B-%Y")}'
-        return current_time
+        return _current_time_str(datetime.now(timezone.utc).date().toordinal())
         
     @staticmethod
     @tool
@@ -38,68 +71,76 @@ class ToolManager:
         # 4. Format and return the results
         
         # For demo purposes, return sample data based on keywords in query
-        if "products" in query.lower() or "revenue" in query.lower():
-            return """
-            | Product          | Revenue   | Units Sold |
-            |------------------|-----------|------------|
-            | Attribution Pro  | $125,000  | 250        |
-            | Marketing Suite  | $87,500   | 350        |
-            | Analytics Basic  | $45,000   | 900        |
-            | Data Connector   | $32,500   | 650        |
-            """
-        elif "customer" in query.lower() or "conversion" in query.lower():
-            return """
-            | Month     | Visitors | Conversions | Rate  |
-            |-----------|----------|-------------|-------|
-            | January   | 25,400   | 762         | 3.0%  |
-            | February  | 28,500   | 913         | 3.2%  |
-            | March     | 32,100   | 1,091       | 3.4%  |
-            | April     | 30,800   | 956         | 3.1%  |
-            """
-        elif "average" in query.lower() or "order" in query.lower():
-            return """
-            | Category        | Avg Order Value |
-            |-----------------|-----------------|
-            | Enterprise      | $3,250          |
-            | Mid-market      | $1,125          |
-            | Small Business  | $485            |
-            """
-        else:
-            return "I don't have specific data for that query. Please try a more specific question about products, revenue, customers, or order values."
+        query = query.lower()
+        for keywords, response in _DATABASE_RESPONSES.items():
+            if any(keyword in query for keyword in keywords):
+                return response
+        return ("I don't have specific data for that query. Please try a more specific question"
+                " about products, revenue, customers, or order values.")
 
     @classmethod
-    def configure_retriever(cls):
-        """Configure and return a vector store retriever."""
+    def _retriever_settings(cls) -> tuple:
+        """Config values the retriever is built from, used as the cache key."""
+        return (
+            cls.config.VECTOR_STORE_CONFIG["index_name"],
+            cls.config.VECTOR_STORE_CONFIG["embedding_model"],
+            cls.config.VECTOR_STORE_CONFIG["dimensions"],
+            cls.config.RETRIEVER_CONFIG["search_type"],
+            cls.config.RETRIEVER_CONFIG["k"],
+            cls.config.RETRIEVER_CONFIG["fetch_k"],
+            cls.config.RETRIEVER_CONFIG["lambda_mult"]
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _build_retriever(index_name, embedding_model, dimensions, search_type, k, fetch_k, lambda_mult):
+        """Build a vector store retriever; cached so the embeddings and Pinecone clients are reused."""
         embeddings = OpenAIEmbeddings(
-            model=cls.config.VECTOR_STORE_CONFIG["embedding_model"],
-            dimensions=cls.config.VECTOR_STORE_CONFIG["dimensions"]
+            model=embedding_model,
+            dimensions=dimensions
         )
 
         vectorstore = PineconeVectorStore(
-            index_name=cls.config.VECTOR_STORE_CONFIG["index_name"],
+            index_name=index_name,
             embedding=embeddings
         )
 
         retriever = vectorstore.as_retriever(
-            search_type=cls.config.RETRIEVER_CONFIG["search_type"],
+            search_type=search_type,
             search_kwargs={
-                "k": cls.config.RETRIEVER_CONFIG["k"],
-                "fetch_k": cls.config.RETRIEVER_CONFIG["fetch_k"],
-                "lambda_mult": cls.config.RETRIEVER_CONFIG["lambda_mult"]
+                "k": k,
+                "fetch_k": fetch_k,
+                "lambda_mult": lambda_mult
             }
         )
         return retriever
 
-    @classmethod
-    def get_retriever_tool(cls):
-        """Create and return a retriever tool."""
-        retriever = cls.configure_retriever()
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _build_retriever_tool(retriever_settings, name, description, document_prompt_template):
+        """Build a retriever tool; cached alongside the retriever it wraps."""
+        retriever = ToolManager._build_retriever(*retriever_settings)
 
         return create_retriever_tool(
             retriever,
+            name,
+            description,
+            document_prompt=PromptTemplate.from_template(document_prompt_template)
+        )
+
+    @classmethod
+    def configure_retriever(cls):
+        """Configure and return a vector store retriever, reused until its config changes."""
+        return cls._build_retriever(*cls._retriever_settings())
+
+    @classmethod
+    def get_retriever_tool(cls):
+        """Create and return a retriever tool, reused until its config changes."""
+        return cls._build_retriever_tool(
+            cls._retriever_settings(),
             cls.config.RETRIEVER_TOOL_CONFIG["name"],
             cls.config.RETRIEVER_TOOL_CONFIG["description"],
-            document_prompt=PromptTemplate.from_template(cls.config.DOCUMENT_PROMPT_TEMPLATE)
+            cls.config.DOCUMENT_PROMPT_TEMPLATE
         )
 
     @classmethod
@@ -0,0 +1,455 @@
+"""
+HTML to markdown conversion backed by lxml
+"""
+import io
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_FENCE = "```"
+_PARAGRAPH_SEPARATOR = "\n\n"
+
+# Boundaries an oversized paragraph is broken at, coarsest first, with the separator each consumes
+_UNIT_BOUNDARIES = (
+    ("\n", re.compile(r"\n")),
+    (" ", re.compile(r"(?<=[.!?]) ")),  # Keep the full stop with its sentence
+    (" ", re.compile(r"(?<=\S) ")),     # Leading spaces, e.g. code indentation, stay with the word
+)
+
+# Tags whose content is never part of the readable text
+_SKIPPED_TAGS = {"script", "style", "noscript", "head", "title", "iframe"}
+
+# Document-level tags; markdown for their children is streamed out as soon as it is complete
+_ROOT_TAGS = {"html", "body"}
+
+
+class _Frame:
+    """Conversion state of an element that is still open during the streaming parse."""
+    __slots__ = ("element", "parts", "items", "rows", "cells", "last_child", "preformatted")
+
+    def __init__(self, element, preformatted: bool):
+        self.element = element
+        self.parts: List[str] = []
+        self.items: List[str] = []  # Converted <li> children of a list
+        self.rows: List[List[str]] = []  # Converted <tr> descendants of a table
+        self.cells: List[str] = []  # Converted <td>/<th> children of a row
+        self.last_child = None
+        self.preformatted = preformatted
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+
+def _collapse(text: str) -> str:
+    """Collapse runs of whitespace the way a browser renders them."""
+    return _WHITESPACE_RE.sub(" ", text) if text else ""
+
+
+def _normalize(markdown: str) -> str:
+    """Strip trailing whitespace from every line and collapse runs of blank lines."""
+    lines = "\n".join(line.rstrip() for line in markdown.splitlines())
+    return _BLANK_LINES_RE.sub("\n\n", lines).strip()
+
+
+def _append_text(frame: _Frame, text: Optional[str]) -> None:
+    """Append element text or a child's tail to a frame."""
+    if not text:
+        return
+    if frame.preformatted:
+        frame.parts.append(text)
+        return
+    text = _collapse(text)
+    # Text following a block element starts a new line, and whitespace an inline element ended with isn't doubled
+    if frame.parts and frame.parts[-1].endswith(("\n", " ")):
+        text = text.lstrip()
+    if text:
+        frame.parts.append(text)
+
+
+def _nearest(stack: List[_Frame], tag: str) -> Optional[_Frame]:
+    """Find the innermost open frame for the given tag."""
+    for frame in reversed(stack):
+        if frame.element.tag == tag:
+            return frame
+    return None
+
+
+def _content(frame: _Frame, stack: List[_Frame]) -> str:
+    return frame.content
+
+
+def _block(frame: _Frame, stack: List[_Frame]) -> str:
+    return f"\n\n{frame.content.strip()}\n\n"
+
+
+def _heading(frame: _Frame, stack: List[_Frame]) -> str:
+    level = int(frame.element.tag[1])
+    return f"\n\n{'#' * level} {frame.content.strip()}\n\n"
+
+
+def _split_edges(frame: _Frame, stack: List[_Frame]) -> Tuple[str, str, str]:
+    """
+    Split inline content into (leading whitespace, text, trailing whitespace).
+
+    Markdown markers must hug the text, so edge whitespace is moved outside of them instead of
+    being dropped, which would glue the text to its neighbours.
+    """
+    content = frame.content
+    text = content.strip()
+    if not text:
+        return content, "", ""
+    lead = content[:len(content) - len(content.lstrip())]
+    trail = content[len(content.rstrip()):]
+    # Don't double whitespace the preceding text already ends with
+    if stack and stack[-1].parts and stack[-1].parts[-1].endswith(("\n", " ")):
+        lead = ""
+    return lead, text, trail
+
+
+def _inline(marker: str) -> Callable:
+    def emit(frame: _Frame, stack: List[_Frame]) -> str:
+        if frame.preformatted:
+            return frame.content
+        lead, text, trail = _split_edges(frame, stack)
+        return f"{lead}{marker}{text}{marker}{trail}" if text else lead
+    return emit
+
+
+def _link(frame: _Frame, stack: List[_Frame]) -> str:
+    lead, text, trail = _split_edges(frame, stack)
+    href = frame.element.get("href")
+    if not href or not text:
+        return f"{lead}{text}{trail}"
+    return f"{lead}[{text}]({href}){trail}"
+
+
+def _image(frame: _Frame, stack: List[_Frame]) -> str:
+    src = frame.element.get("src")
+    return f"![{frame.element.get('alt', '')}]({src})" if src else ""
+
+
+def _line_break(frame: _Frame, stack: List[_Frame]) -> str:
+    return "\n"
+
+
+def _rule(frame: _Frame, stack: List[_Frame]) -> str:
+    return "\n\n---\n\n"
+
+
+def _preformatted(frame: _Frame, stack: List[_Frame]) -> str:
+    code = frame.content.strip("\n")
+    return f"\n\n```\n{code}\n```\n\n"
+
+
+def _blockquote(frame: _Frame, stack: List[_Frame]) -> str:
+    lines = _normalize(frame.content).splitlines()
+    return "\n\n" + "\n".join(f"> {line}".rstrip() for line in lines) + "\n\n"
+
+
+def _list_item(frame: _Frame, stack: List[_Frame]) -> str:
+    # Hand the item to the enclosing list, which knows its marker
+    if stack and stack[-1].element.tag in ("ul", "ol"):
+        stack[-1].items.append(frame.content)
+        return ""
+    return _block(frame, stack)
+
+
+def _list(frame: _Frame, stack: List[_Frame]) -> str:
+    ordered = frame.element.tag == "ol"
+    items = []
+    for index, item in enumerate(frame.items, start=1):
+        marker = f"{index}." if ordered else "-"
+        lines = _normalize(item).splitlines() or [""]
+        # Indent continuation lines (e.g. nested lists) under the item marker
+        indent = " " * (len(marker) + 1)
+        body = "\n".join([lines[0]] + [f"{indent}{line}" if line else "" for line in lines[1:]])
+        items.append(f"{marker} {body}")
+    return "\n\n" + "\n".join(items) + "\n\n"
+
+
+def _table_cell(frame: _Frame, stack: List[_Frame]) -> str:
+    row = _nearest(stack, "tr")
+    if row is None:
+        return frame.content
+    row.cells.append(frame.content.strip().replace("|", "\\|"))
+    return ""
+
+
+def _table_row(frame: _Frame, stack: List[_Frame]) -> str:
+    table = _nearest(stack, "table")
+    if table is not None and frame.cells:
+        table.rows.append(frame.cells)
+    return ""
+
+
+def _table(frame: _Frame, stack: List[_Frame]) -> str:
+    if not frame.rows:
+        return ""
+
+    width = max(len(row) for row in frame.rows)
+    lines = []
+    for i, row in enumerate(frame.rows):
+        row = row + [""] * (width - len(row))
+        lines.append("| " + " | ".join(row) + " |")
+        if i == 0:
+            lines.append("|" + "---|" * width)
+    return "\n\n" + "\n".join(lines) + "\n\n"
+
+
+def _skip(frame: _Frame, stack: List[_Frame]) -> str:
+    return ""
+
+
+# Tag -> markdown emitter. Tags not listed here contribute their content only.
+_EMITTERS: Dict[str, Callable] = {
+    **{f"h{level}": _heading for level in range(1, 7)},
+    **{tag: _block for tag in ("p", "div", "section", "article", "header", "footer", "figure")},
+    **{tag: _inline("**") for tag in ("strong", "b")},
+    **{tag: _inline("*") for tag in ("em", "i")},
+    **{tag: _skip for tag in _SKIPPED_TAGS},
+    **{tag: _table_cell for tag in ("td", "th")},
+    "code": _inline("`"),
+    "a": _link,
+    "img": _image,
+    "br": _line_break,
+    "hr": _rule,
+    "pre": _preformatted,
+    "blockquote": _blockquote,
+    "li": _list_item,
+    "ul": _list,
+    "ol": _list,
+    "tr": _table_row,
+    "table": _table,
+}
+
+
+def iter_markdown(html_content: str) -> Iterator[str]:
+    """
+    Stream the markdown for an HTML fragment or document.
+
+    The HTML is parsed incrementally and each element is released as soon as it has been
+    converted, so memory is bounded by nesting depth rather than document size. Open
+    elements are tracked on an explicit stack, so deeply nested markup cannot hit the
+    recursion limit.
+
+    Args:
+        html_content: HTML content to convert
+
+    Yields:
+        Markdown pieces for each top-level block, in document order
+
+    Raises:
+        ValueError: If the parser gave up before the end of the document, e.g. past
+            libxml2's nesting depth limit. Pieces already yielded are then incomplete.
+    """
+    if not html_content or not html_content.strip():
+        return
+
+    events = etree.iterparse(
+        io.BytesIO(html_content.encode("utf-8")),
+        events=("start", "end"),
+        html=True,
+        encoding="utf-8",
+        remove_comments=True,
+        remove_pis=True,
+    )
+
+    stack: List[_Frame] = []
+    for event, element in events:
+        if event == "start":
+            parent = stack[-1] if stack else None
+            if parent is not None:
+                # The parent's text, or the previous sibling's tail, is complete once a new child starts
+                if parent.last_child is None:
+                    _append_text(parent, parent.element.text)
+                else:
+                    _append_text(parent, parent.last_child.tail)
+                    parent.element.remove(parent.last_child)
+            preformatted = element.tag == "pre" or (parent is not None and parent.preformatted)
+            stack.append(_Frame(element, preformatted))
+            continue
+
+        frame = stack.pop()
+        if frame.last_child is None:
+            _append_text(frame, element.text)
+        else:
+            _append_text(frame, frame.last_child.tail)
+
+        markdown = _EMITTERS.get(element.tag, _content)(frame, stack)
+        element.clear(keep_tail=True)
+
+        if not stack:
+            if markdown:
+                yield markdown
+            continue
+
+        parent = stack[-1]
+        parent.last_child = element
+        if markdown:
+            parent.parts.append(markdown)
+
+        # Nothing outside the document root needs converted content, so flush it right away
+        if parent.element.tag in _ROOT_TAGS and parent.parts:
+            yield parent.content
+            parent.parts.clear()
+
+    # libxml2 stops at fatal errors such as its nesting depth limit without raising, which would
+    # silently drop the rest of the document
+    for error in events.error_log:
+        if error.level == etree.ErrorLevels.FATAL:
+            raise ValueError(f"Could not parse HTML at line {error.line}: {error.message}")
+
+
+def _split_paragraphs(markdown: str) -> Iterator[str]:
+    """Split markdown at blank lines, keeping fenced code blocks in one piece."""
+    lines: List[str] = []
+    in_fence = False
+    for line in markdown.split("\n"):
+        line = line.rstrip()
+        if line.lstrip().startswith(_FENCE):
+            in_fence = not in_fence
+        if in_fence and not line:
+            # Like _normalize, runs of blank lines inside code collapse to one
+            if lines[-1]:
+                lines.append(line)
+        elif line:
+            lines.append(line)
+        elif lines:
+            yield "\n".join(lines)
+            lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def iter_paragraphs(html_content: str) -> Iterator[str]:
+    """
+    Stream the markdown paragraphs (blocks separated by a blank line) of an HTML fragment or document.
+
+    Args:
+        html_content: HTML content to convert
+
+    Yields:
+        Markdown paragraphs, in document order
+    """
+    buffer = ""
+    for piece in iter_markdown(html_content):
+        buffer += piece
+        # Inline text may continue in the next piece, so only split at a block boundary outside code
+        if buffer.endswith(_PARAGRAPH_SEPARATOR) and buffer.count(_FENCE) % 2 == 0:
+            yield from _split_paragraphs(buffer)
+            buffer = ""
+    yield from _split_paragraphs(buffer)
+
+
+def _split_units(text: str, limit: int, separator: str = _PARAGRAPH_SEPARATOR) -> Iterator[Tuple[str, str]]:
+    """
+    Break text into pieces of at most limit characters at line, then sentence, then word boundaries.
+
+    Args:
+        text: Text to break up
+        limit: Maximum piece length in characters
+        separator: Separator joining the first piece to the text before it
+
+    Yields:
+        (separator, piece) tuples; joining them in order gives back the text
+    """
+    if len(text) <= limit:
+        yield separator, text
+        return
+    for boundary, pattern in _UNIT_BOUNDARIES:
+        parts = [part for part in pattern.split(text) if part]
+        if len(parts) > 1:
+            for i, part in enumerate(parts):
+                yield from _split_units(part, limit, separator if i == 0 else boundary)
+            return
+    # No boundary left, so cut the text hard
+    for i in range(0, len(text), limit):
+        yield separator if i == 0 else "", text[i:i + limit]
+
+
+def _join_window(window: Iterable[Tuple[str, str]]) -> str:
+    """Join (separator, piece) tuples into a chunk, dropping the separator of the first piece."""
+    pieces = iter(window)
+    first = next(pieces)[1]
+    return first + "".join(separator + piece for separator, piece in pieces)
+
+
+def pack_chunks(paragraphs: Iterable[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    """
+    Pack markdown paragraphs into chunks for embedding.
+
+    Chunks break between paragraphs and hold at most chunk_size characters. Trailing
+    paragraphs of up to overlap characters are repeated at the start of the next chunk.
+    Paragraphs longer than chunk_size are broken into sentences or words of at most overlap
+    characters first, so their chunks overlap too.
+
+    Args:
+        paragraphs: Markdown paragraphs, in document order
+        chunk_size: Maximum chunk length in characters
+        overlap: Maximum length of the context carried over between chunks
+
+    Yields:
+        Chunks, in document order
+    """
+    unit_limit = min(overlap, chunk_size) if overlap > 0 else chunk_size
+    window: Deque[Tuple[str, str]] = deque()  # (separator before the piece, piece)
+    size = 0  # Length of the joined window
+    for paragraph in paragraphs:
+        if len(paragraph) > chunk_size:
+            pieces = _split_units(paragraph, unit_limit)
+        else:
+            pieces = [(_PARAGRAPH_SEPARATOR, paragraph)]
+
+        for separator, piece in pieces:
+            if window and size + len(separator) + len(piece) > chunk_size:
+                yield _join_window(window)
+                # Keep only the overlap, and only as much of it as leaves room for the new piece
+                while window and (size > overlap or size + len(separator) + len(piece) > chunk_size):
+                    size -= len(window.popleft()[1])
+                    if window:
+                        # The new first piece is no longer joined to anything before it
+                        size -= len(window[0][0])
+            size += len(piece) + (len(separator) if window else 0)
+            window.append((separator, piece))
+    if window:
+        yield _join_window(window)
+
+
+def html_to_markdown(html_content: str) -> str:
+    """
+    Convert an HTML fragment or document to markdown.
+
+    Args:
+        html_content: HTML content to convert
+
+    Returns:
+        Markdown string
+    """
+    return _normalize("".join(iter_markdown(html_content)))
+
+
+def convert_html(html_content: str, chunk_size: int, overlap: int) -> Tuple[str, Optional[List[str]], Optional[str]]:
+    """
+    Convert HTML to markdown and split it into chunks, both from a single parse.
+    Kept in this lightweight module so worker processes can import it cheaply.
+
+    Args:
+        html_content: HTML content to convert
+        chunk_size: Maximum chunk length in characters
+        overlap: Maximum length of the context carried over between chunks
+
+    Returns:
+        Tuple of (markdown, chunks, error). If conversion failed, markdown is the original
+        HTML, chunks is None and error describes the failure.
+    """
+    try:
+        paragraphs = list(iter_paragraphs(html_content))
+    except Exception as e:
+        # Errors are returned rather than logged, since workers don't share the caller's logging setup
+        return html_content, None, str(e)
+    return _PARAGRAPH_SEPARATOR.join(paragraphs), list(pack_chunks(paragraphs, chunk_size, overlap)), None